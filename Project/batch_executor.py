@@ -0,0 +1,146 @@
+"""
+Runs many independent canvas pipelines at once on a process pool.
+
+Each pipeline is compiled to ops and reduced to the ops that actually
+shape its output. Everything before the last op that ignores its input
+(`cat FILE`, `echo TEXT`) cannot change the result. stdin/stdout stages,
+a bare `cat` and an Echo without text only pass data along, so they are
+dropped too. The reduced op lists are merged into a
+prefix tree, so pipelines that start the same way compute that shared
+upstream part once. Each run of single-child tree nodes becomes one pool
+task, and a node's children are scheduled as soon as its output exists.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from model import Command, StandardOut, run_ops
+from pipeline_compiler import Op, compile_chain
+
+PASS_KINDS = ("pass", "stdin", "stdout")
+
+
+def ignores_input(op: Op) -> bool:
+    return (op.kind == "cat" or op.kind == "echo") and bool(op.arg)
+
+
+def passes_through(op: Op) -> bool:
+    return op.kind in PASS_KINDS or ((op.kind == "cat" or op.kind == "echo") and not op.arg)
+
+
+def effective_ops(ops: Sequence[Op]) -> Tuple[Op, ...]:
+    """The ops that determine a pipeline's output, in order."""
+    kept = [op for op in ops if not passes_through(op)]
+    start = 0
+    for i, op in enumerate(kept):
+        if ignores_input(op):
+            start = i
+    return tuple(kept[start:])
+
+
+class _Segment:
+    """A run of ops in the prefix tree, executed as one pool task."""
+
+    def __init__(self, ops: Tuple[Op, ...], parent: Optional["_Segment"]):
+        self.ops = ops
+        self.parent = parent
+        self.children: List["_Segment"] = []
+        self.pipelines: List[int] = []  # pipelines whose output is this segment's output
+
+
+def _build_tree(keys: List[Tuple[Op, ...]]) -> _Segment:
+    """Prefix tree over op tuples with single-child chains merged into one segment."""
+    trie: Dict = {}
+    for index, key in enumerate(keys):
+        node = trie
+        for op in key:
+            node = node.setdefault(op, {})
+        node.setdefault(None, []).append(index)
+
+    root = _Segment((), None)
+    stack = [(trie, root)]
+    while stack:
+        node, segment = stack.pop()
+        segment.pipelines.extend(node.get(None, []))
+        for op, child in node.items():
+            if op is None:
+                continue
+            ops = [op]
+            # Follow the chain while it neither branches nor ends a pipeline
+            while None not in child and len(child) == 1:
+                op, child = next(iter(child.items()))
+                ops.append(op)
+            sub = _Segment(tuple(ops), segment)
+            segment.children.append(sub)
+            stack.append((child, sub))
+    return root
+
+
+class BatchReport:
+    def __init__(self, outputs: List[bytes], tasks: int, ops_run: int, ops_total: int, makespan: float):
+        self.outputs = outputs
+        self.tasks = tasks
+        self.ops_run = ops_run  # ops executed after sharing
+        self.ops_total = ops_total  # ops the pipelines would have run separately
+        self.makespan = makespan
+
+    @property
+    def bytes_out(self) -> int:
+        return sum(len(o) for o in self.outputs)
+
+    @property
+    def throughput(self) -> float:
+        """Output bytes per second over the whole batch."""
+        return self.bytes_out / self.makespan if self.makespan > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return (f"<BatchReport {len(self.outputs)} pipelines, {self.tasks} tasks, "
+                f"{self.ops_run}/{self.ops_total} ops run, makespan {self.makespan:.3f}s, "
+                f"{self.throughput / 1e6:.1f} MB/s>")
+
+
+def run_batch(heads: Sequence[Command], input: bytes = b"", executor: Optional[Executor] = None,
+              max_workers: Optional[int] = None) -> BatchReport:
+    """
+    Run every chain in heads, sharing identical upstream work, and write
+    each result into its chain's StandardOut. input feeds chains that
+    start by reading stdin.
+    """
+    started = time.perf_counter()
+    keys = [effective_ops(compile_chain(h).ops) for h in heads]
+    root = _build_tree(keys)
+    outputs: List[bytes] = [b""] * len(heads)
+
+    own_pool = executor is None
+    if own_pool:
+        executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1)
+    pending: Dict[Future, _Segment] = {}
+    counts = {"tasks": 0, "ops": 0}
+
+    def complete(segment: _Segment, data: bytes) -> None:
+        for index in segment.pipelines:
+            outputs[index] = data
+        for child in segment.children:
+            pending[executor.submit(run_ops, child.ops, data)] = child
+            counts["tasks"] += 1
+            counts["ops"] += len(child.ops)
+
+    try:
+        complete(root, input)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                segment = pending.pop(future)
+                complete(segment, future.result())
+    finally:
+        if own_pool:
+            executor.shutdown()
+
+    for head, output in zip(heads, outputs):
+        out = compile_chain(head).stages[-1]
+        if isinstance(out, StandardOut):
+            out.write(output)
+            out.value = output
+    return BatchReport(outputs, counts["tasks"], counts["ops"], sum(len(k) for k in keys),
+                       time.perf_counter() - started)
@@ -0,0 +1,373 @@
+"""
+Headless benchmarks for the block editor hot paths.
+
+Runs under SDL's dummy video driver, so no screen is needed:
+
+    python benchmark.py --sizes 10 1000 10000 --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+Results are written as JSON (one record per operation and canvas size) so
+runs can be diffed or compared with --compare.
+"""
+import argparse
+import contextlib
+import copy
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from itertools import cycle
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+import experiment_add1 as editor
+# Opening the window prints its size; keep that off stdout
+with contextlib.redirect_stdout(sys.stderr):
+    editor.init_app()
+import block_store
+
+DEFAULT_SIZES = [10, 1_000, 10_000, 100_000]
+SEED = 1234
+
+
+class Workspace:
+    """A synthetic editor state: canvas, sandbox and n random blocks."""
+
+    def __init__(self, n_blocks: int, seed: int = SEED):
+        self.rng = random.Random(seed)
+        self.canvas = editor.Canvas(x=0, y=0, w=editor.CANVAS_W, h=editor.WINDOW_H)
+        self.sandbox = editor.Sandbox(x=editor.CANVAS_W, y=0, w=editor.SANDBOX_W, h=editor.WINDOW_H)
+        editor.layout_templates(self.sandbox, [editor.Echo, editor.Cat])
+        self._store_canvas = None
+        self.view = editor.Viewport(self.canvas.get_rect())
+        w, h = editor.TEMPLATE_W, editor.TEMPLATE_H
+        max_x, max_y = max(editor.CANVAS_W - w, 1), max(editor.WINDOW_H - h, 1)
+        for i in range(n_blocks):
+            cls = editor.Echo if i % 2 == 0 else editor.Cat
+            self.canvas.append_command(cls(self.rng.randrange(max_x), self.rng.randrange(max_y), w, h))
+
+    def store_canvas(self) -> "editor.StoreCanvas":
+        """The same blocks in a NumPy-backed StoreCanvas (built on first use)."""
+        if self._store_canvas is None:
+            self._store_canvas = editor.StoreCanvas(x=0, y=0, w=editor.CANVAS_W, h=editor.WINDOW_H)
+            for b in self.canvas.get_commands():
+                self._store_canvas.append_command(b)
+        return self._store_canvas
+
+    def random_canvas_point(self):
+        return (self.rng.randrange(editor.CANVAS_W), self.rng.randrange(editor.WINDOW_H))
+
+
+def op_draw_scene(ws: Workspace) -> Callable[[], None]:
+    def run():
+        editor.draw_scene(ws.canvas, ws.sandbox, ws.view, None, editor.Origin.TEMPLATE)
+    return run
+
+
+def op_draw_scene_zoomed(ws: Workspace) -> Callable[[], None]:
+    """Full frame zoomed in two steps on the canvas centre: fewer, scaled blocks."""
+    view = editor.Viewport(ws.canvas.get_rect())
+    view.zoom_at(2, editor.CANVAS_W // 2, editor.WINDOW_H // 2)
+
+    def run():
+        editor.draw_scene(ws.canvas, ws.sandbox, view, None, editor.Origin.TEMPLATE)
+    return run
+
+
+def op_hit_test(ws: Workspace) -> Callable[[], None]:
+    points = cycle([ws.random_canvas_point() for _ in range(256)])
+
+    def run():
+        p = next(points)
+        if ws.sandbox.template_at(*p) is None:
+            ws.canvas.command_at(*p)
+    return run
+
+
+def op_hit_test_linear(ws: Workspace) -> Callable[[], None]:
+    """The original reversed() list walk, kept as a baseline."""
+    points = cycle([ws.random_canvas_point() for _ in range(256)])
+    blocks = ws.canvas.get_commands()
+
+    def run():
+        p = next(points)
+        for b in reversed(blocks):
+            if b.get_rect().collidepoint(p):
+                break
+    return run
+
+
+def op_drag_motion(ws: Workspace) -> Callable[[], None]:
+    """One MOUSEMOTION of a dragged block, including the dirty-region repaint."""
+    dragging = ws.sandbox.get_templates()[0].clone()
+    dirty = editor.DirtyTracker(editor.screen.get_rect())
+    dirty.take()
+    path = cycle([ws.random_canvas_point() for _ in range(256)])
+
+    def run():
+        mx, my = next(path)
+        dirty.add(dragging.get_rect())
+        dragging.x, dragging.y = mx - dragging.w // 2, my - dragging.h // 2
+        dirty.add(dragging.get_rect())
+        for region in dirty.take():
+            editor.draw_region(ws.canvas, ws.sandbox, region, ws.view, dragging, editor.Origin.TEMPLATE)
+    return run
+
+
+def op_group_drag_motion(ws: Workspace) -> Callable[[], None]:
+    """One MOUSEMOTION while dragging a rubber-band selection of half the canvas."""
+    canvas = editor.Canvas(x=0, y=0, w=editor.CANVAS_W, h=editor.WINDOW_H)
+    for b in ws.canvas.get_commands():
+        canvas.append_command(b.clone())
+    selection = editor.Selection(editor.SELECT_COLOR, editor.BAND_COLOR)
+    selection.start_band(0, 0)
+    selection.update_band(editor.CANVAS_W // 2, editor.WINDOW_H - 1)
+    selection.finish_band(canvas, ws.view)
+    selection.sprite = editor.build_group_sprite(selection.blocks, editor.union_bounds(selection.blocks), ws.view)
+    selection.start_drag(canvas, editor.CANVAS_W // 4, editor.WINDOW_H // 2)
+    dirty = editor.DirtyTracker(editor.screen.get_rect())
+    dirty.take()
+    path = cycle([ws.random_canvas_point() for _ in range(256)])
+    area = ws.view.visible_bounds()
+
+    def run():
+        for bounds in selection.drag_to(*next(path), area):
+            dirty.add(ws.view.screen_rect(bounds))
+        for region in dirty.take():
+            editor.draw_region(canvas, ws.sandbox, region, ws.view, None, editor.Origin.TEMPLATE,
+                               selection=selection)
+    return run
+
+
+def op_drop(ws: Workspace) -> Callable[[], None]:
+    """Drop a template clone: discard check, clamp, insert (then undo the insert)."""
+    template = ws.sandbox.get_templates()[1]
+    points = cycle([ws.random_canvas_point() for _ in range(256)])
+
+    def run():
+        mx, my = next(points)
+        block = template.clone()
+        block.x, block.y = mx - block.w // 2, my - block.h // 2
+        block = editor.discard_if_in_sandbox(block, editor.Origin.TEMPLATE, mx, my, ws.canvas)
+        if block is not None:
+            rect = editor.clamp_to_canvas(block.get_rect())
+            block.x, block.y = rect.x, rect.y
+            ws.canvas.append_command(block)
+            ws.canvas.remove_command(block)
+    return run
+
+
+def op_store_hit_test(ws: Workspace) -> Callable[[], None]:
+    store = ws.store_canvas().index
+    points = cycle([ws.random_canvas_point() for _ in range(256)])
+
+    def run():
+        store.query_point(*next(points))
+    return run
+
+
+def op_store_translate_clamp(ws: Workspace) -> Callable[[], None]:
+    """Move every block by one step and clamp them back into the canvas."""
+    store = ws.store_canvas().index
+    bounds = (0, 0, editor.CANVAS_W, editor.WINDOW_H)
+    steps = cycle([(3, 2), (-3, -2)])
+
+    def run():
+        dx, dy = next(steps)
+        store.translate(dx, dy)
+        store.clamp(bounds)
+    return run
+
+
+def op_clone(ws: Workspace) -> Callable[[], None]:
+    template = ws.sandbox.get_templates()[0]
+
+    def run():
+        template.clone()
+    return run
+
+
+OPERATIONS: Dict[str, Callable[[Workspace], Callable[[], None]]] = {
+    "draw_scene": op_draw_scene,
+    "draw_scene_zoomed": op_draw_scene_zoomed,
+    "hit_test": op_hit_test,
+    "hit_test_linear": op_hit_test_linear,
+    "drag_motion": op_drag_motion,
+    "group_drag_motion": op_group_drag_motion,
+    "drop": op_drop,
+    "clone": op_clone,
+    "store_hit_test": op_store_hit_test,
+    "store_translate_clamp": op_store_translate_clamp,
+}
+
+# Operations that need numpy; skipped when it is not installed
+STORE_OPERATIONS = {"store_hit_test", "store_translate_clamp"}
+
+
+class LegacyCommand:
+    """The pre-__slots__ block model: own __dict__, own Color, deepcopy clone."""
+
+    def __init__(self, x: float, y: float, w: int, h: int):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.color = pygame.Color("#4CAF50")
+        self.label = "Echo"
+
+    def clone(self) -> "LegacyCommand":
+        return copy.deepcopy(self)
+
+
+def compare_block_models(n_blocks: int) -> List[dict]:
+    """Memory for n blocks and clone throughput, legacy model vs editor.Echo."""
+    results = []
+    for name, cls in (("legacy_deepcopy", LegacyCommand), ("slots_flyweight", editor.Echo)):
+        tracemalloc.start()
+        blocks = [cls(i % 500, i % 400, editor.TEMPLATE_W, editor.TEMPLATE_H) for i in range(n_blocks)]
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        t0 = time.perf_counter()
+        for b in blocks:
+            b.clone()
+        elapsed = time.perf_counter() - t0
+        results.append({
+            "model": name,
+            "blocks": n_blocks,
+            "bytes": memory,
+            "bytes_per_block": memory / n_blocks,
+            "clones_per_sec": n_blocks / elapsed,
+        })
+        print(f"  {name:<22} {memory / n_blocks:>8.1f} B/block {n_blocks / elapsed:>12.0f} clones/s", file=sys.stderr)
+    return results
+
+
+def time_op(run: Callable[[], None], min_time: float, max_repeats: int) -> List[float]:
+    """Call run() until min_time has passed (at least 3 times); return seconds per call."""
+    run()  # warm caches
+    samples: List[float] = []
+    start = time.perf_counter()
+    while len(samples) < max_repeats and (len(samples) < 3 or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def alloc_peak(run: Callable[[], None]) -> int:
+    """Peak bytes allocated by a single call."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return max(peak - base, 0)
+
+
+def workspace_memory(n_blocks: int) -> int:
+    tracemalloc.start()
+    ws = Workspace(n_blocks)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del ws
+    return size
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run_suite(sizes: List[int], ops: List[str], min_time: float, max_repeats: int,
+              model_blocks: int = 0) -> dict:
+    results = []
+    for n in sizes:
+        ws = Workspace(n)
+        memory = workspace_memory(n)
+        print(f"{n} blocks: workspace {memory / 1e6:.1f} MB", file=sys.stderr)
+        for name in ops:
+            if name in STORE_OPERATIONS and block_store.np is None:
+                print(f"  {name:<22} skipped (numpy not installed)", file=sys.stderr)
+                continue
+            run = OPERATIONS[name](ws)
+            samples = time_op(run, min_time, max_repeats)
+            record = {
+                "op": name,
+                "blocks": n,
+                "repeats": len(samples),
+                "mean_us": statistics.fmean(samples) * 1e6,
+                "median_us": statistics.median(samples) * 1e6,
+                "min_us": min(samples) * 1e6,
+                "p95_us": percentile(samples, 0.95) * 1e6,
+                "alloc_peak_bytes": alloc_peak(run),
+                "workspace_bytes": memory,
+            }
+            results.append(record)
+            print(f"  {name:<22} {record['median_us']:>12.1f} us", file=sys.stderr)
+    models = []
+    if model_blocks:
+        print(f"block models at {model_blocks} blocks:", file=sys.stderr)
+        models = compare_block_models(model_blocks)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "video_driver": os.environ.get("SDL_VIDEODRIVER"),
+            "window": [editor.WINDOW_W, editor.WINDOW_H],
+            "seed": SEED,
+        },
+        "results": results,
+        "models": models,
+    }
+
+
+def compare(current: dict, baseline: dict) -> str:
+    """Median-time ratios (current / baseline) for every op present in both runs."""
+    old = {(r["op"], r["blocks"]): r for r in baseline["results"]}
+    lines = [f"{'op':<16} {'blocks':>8} {'before us':>12} {'after us':>12} {'ratio':>7}"]
+    for r in current["results"]:
+        b = old.get((r["op"], r["blocks"]))
+        if b is None:
+            continue
+        ratio = r["median_us"] / b["median_us"] if b["median_us"] else float("inf")
+        lines.append(f"{r['op']:<16} {r['blocks']:>8} {b['median_us']:>12.1f} {r['median_us']:>12.1f} {ratio:>7.2f}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--ops", nargs="+", choices=sorted(OPERATIONS), default=list(OPERATIONS))
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend per operation")
+    parser.add_argument("--max-repeats", type=int, default=10_000)
+    parser.add_argument("--models", type=int, default=0, metavar="N",
+                        help="also compare block-model memory and clone speed at N blocks (e.g. 100000)")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.sizes, args.ops, args.min_time, args.max_repeats, args.models)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
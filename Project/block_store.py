@@ -0,0 +1,294 @@
+"""
+Struct-of-arrays storage for very large canvases.
+
+Block geometry, type and z-order live in contiguous NumPy arrays, so
+hit-tests, rectangle queries, translation and clamping run as vectorized
+array operations instead of per-block Python loops. BlockHandle objects
+give each stored block the usual Command interface (x, y, w, h, style,
+get_rect(), clone(), ...). NumPy is optional; without it BlockStore
+raises ImportError when constructed and the editor keeps using plain lists.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import pygame
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+Bounds = Tuple[int, int, int, int]
+
+
+class BlockHandle:
+    """A thin reference to one row of a BlockStore that behaves like a Command."""
+    __slots__ = ("store", "id")
+
+    def __init__(self, store: "BlockStore", idx: int):
+        self.store = store
+        self.id = idx
+
+    @property
+    def x(self) -> float:
+        return float(self.store.x[self.id])
+
+    @x.setter
+    def x(self, value: float) -> None:
+        self.store.x[self.id] = value
+
+    @property
+    def y(self) -> float:
+        return float(self.store.y[self.id])
+
+    @y.setter
+    def y(self, value: float) -> None:
+        self.store.y[self.id] = value
+
+    @property
+    def w(self) -> int:
+        return int(self.store.w[self.id])
+
+    @w.setter
+    def w(self, value: int) -> None:
+        self.store.w[self.id] = value
+
+    @property
+    def h(self) -> int:
+        return int(self.store.h[self.id])
+
+    @h.setter
+    def h(self, value: int) -> None:
+        self.store.h[self.id] = value
+
+    @property
+    def kind(self) -> type:
+        """The Command class this block stands for."""
+        return self.store.types[self.store.type_id[self.id]]
+
+    @property
+    def style(self):
+        return self.kind.style
+
+    @property
+    def color(self) -> Tuple[int, int, int, int]:
+        return self.kind.style.color
+
+    @property
+    def label(self) -> str:
+        return self.kind.style.label
+
+    def get_rect(self) -> pygame.Rect:
+        return pygame.Rect(*self.get_bounds())
+
+    def get_bounds(self) -> Bounds:
+        s, i = self.store, self.id
+        return (int(s.x[i]), int(s.y[i]), int(s.w[i]), int(s.h[i]))
+
+    def clone(self):
+        """A free-standing Command (not in any store) with the same type and geometry."""
+        return self.kind(self.x, self.y, self.w, self.h)
+
+
+class BlockStore:
+    """
+    Blocks as parallel arrays: x, y, w, h, type id, z and a live flag.
+
+    Removed rows go on a free list and are reused. hide()/show() take a
+    block out of queries without freeing its row, which is what a drag
+    needs: the handle keeps working while the block follows the mouse.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        if np is None:
+            raise ImportError("BlockStore needs numpy (pip install numpy)")
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.w = np.zeros(capacity, dtype=np.int32)
+        self.h = np.zeros(capacity, dtype=np.int32)
+        self.type_id = np.zeros(capacity, dtype=np.int16)
+        self.z = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.size = 0  # rows in use or on the free list
+        self.free: List[int] = []
+        self.handles: List[Optional[BlockHandle]] = []
+        self.types: List[type] = []
+        self.type_ids: Dict[type, int] = {}
+        self.next_z = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, handle: object) -> bool:
+        return (isinstance(handle, BlockHandle) and handle.store is self
+                and bool(self.alive[handle.id]))
+
+    def _grow(self) -> None:
+        capacity = len(self.x) * 2
+        for name in ("x", "y", "w", "h", "type_id", "z", "alive"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _type_id(self, cls: type) -> int:
+        tid = self.type_ids.get(cls)
+        if tid is None:
+            tid = self.type_ids[cls] = len(self.types)
+            self.types.append(cls)
+        return tid
+
+    def add(self, cls: type, x: float, y: float, w: int, h: int) -> BlockHandle:
+        """Store a new block of Command class cls on top of the others."""
+        if self.free:
+            idx = self.free.pop()
+        else:
+            if self.size == len(self.x):
+                self._grow()
+            idx = self.size
+            self.size += 1
+            self.handles.append(None)
+        self.x[idx], self.y[idx], self.w[idx], self.h[idx] = x, y, w, h
+        self.type_id[idx] = self._type_id(cls)
+        self.z[idx] = self.next_z
+        self.next_z += 1
+        self.alive[idx] = True
+        self.count += 1
+        handle = BlockHandle(self, idx)
+        self.handles[idx] = handle
+        return handle
+
+    def add_command(self, cmd) -> BlockHandle:
+        """Store a plain Command (or re-show one of our own handles)."""
+        if isinstance(cmd, BlockHandle) and cmd.store is self:
+            self.show(cmd)
+            return cmd
+        return self.add(getattr(cmd, "kind", cmd.__class__), cmd.x, cmd.y, cmd.w, cmd.h)
+
+    def extend(self, types: Sequence[type], type_index, x, y, w, h) -> List[BlockHandle]:
+        """
+        Append many blocks at once from columns (anything NumPy can read,
+        e.g. memoryviews into a mapped workspace file). type_index indexes
+        into types. The new blocks go on top, in column order.
+        """
+        n = len(x)
+        start = self.size
+        while start + n > len(self.x):
+            self._grow()
+        rows = slice(start, start + n)
+        self.x[rows] = np.asarray(x)
+        self.y[rows] = np.asarray(y)
+        self.w[rows] = np.asarray(w)
+        self.h[rows] = np.asarray(h)
+        remap = np.array([self._type_id(cls) for cls in types], dtype=np.int16)
+        self.type_id[rows] = remap[np.asarray(type_index)] if n else 0
+        self.z[rows] = np.arange(self.next_z, self.next_z + n)
+        self.next_z += n
+        self.alive[rows] = True
+        self.size += n
+        self.count += n
+        new = [BlockHandle(self, i) for i in range(start, start + n)]
+        self.handles.extend(new)
+        return new
+
+    def remove(self, handle: BlockHandle) -> None:
+        """Free the block's row. The handle must not be used afterwards."""
+        idx = handle.id
+        if self.handles[idx] is not handle:
+            return
+        if self.alive[idx]:
+            self.count -= 1
+        self.alive[idx] = False
+        self.handles[idx] = None
+        self.free.append(idx)
+
+    def hide(self, handle: BlockHandle) -> None:
+        """Take the block out of queries but keep its row (e.g. while dragging)."""
+        if self.alive[handle.id]:
+            self.alive[handle.id] = False
+            self.count -= 1
+
+    def show(self, handle: BlockHandle, raise_to_top: bool = True) -> None:
+        if not self.alive[handle.id]:
+            self.alive[handle.id] = True
+            self.count += 1
+        if raise_to_top:
+            self.z[handle.id] = self.next_z
+            self.next_z += 1
+
+    def hide_many(self, handles: Sequence[BlockHandle]) -> None:
+        """hide() for a whole group in one array operation."""
+        ids = self._ids(handles)
+        self.count -= int(np.count_nonzero(self.alive[ids]))
+        self.alive[ids] = False
+
+    def show_many(self, handles: Sequence[BlockHandle]) -> None:
+        """show() for a whole group; the group goes on top in the given order."""
+        ids = self._ids(handles)
+        self.count += int(np.count_nonzero(~self.alive[ids]))
+        self.alive[ids] = True
+        self.z[ids] = np.arange(self.next_z, self.next_z + len(ids))
+        self.next_z += len(ids)
+
+    def live_ids(self) -> "np.ndarray":
+        return np.flatnonzero(self.alive[:self.size])
+
+    def ids_in_z_order(self, ids: Optional["np.ndarray"] = None) -> "np.ndarray":
+        if ids is None:
+            ids = self.live_ids()
+        return ids[np.argsort(self.z[ids], kind="stable")]
+
+    def handles_for(self, ids: Iterable[int]) -> List[BlockHandle]:
+        handles = self.handles
+        return [handles[i] for i in ids]
+
+    def query_point(self, px: float, py: float) -> Optional[BlockHandle]:
+        """Topmost live block containing the point, or None."""
+        n = self.size
+        x, y = self.x[:n], self.y[:n]
+        # Compare on the same integer grid get_rect() uses
+        xi, yi = x.astype(np.int64), y.astype(np.int64)
+        mask = (self.alive[:n] & (xi <= px) & (px < xi + self.w[:n])
+                & (yi <= py) & (py < yi + self.h[:n]))
+        ids = np.flatnonzero(mask)
+        if len(ids) == 0:
+            return None
+        return self.handles[int(ids[np.argmax(self.z[ids])])]
+
+    def query_rect_ids(self, bounds: Bounds) -> "np.ndarray":
+        """Row ids of live blocks overlapping bounds, bottom to top."""
+        qx, qy, qw, qh = bounds
+        n = self.size
+        xi, yi = self.x[:n].astype(np.int64), self.y[:n].astype(np.int64)
+        mask = (self.alive[:n] & (xi < qx + qw) & (qx < xi + self.w[:n])
+                & (yi < qy + qh) & (qy < yi + self.h[:n]))
+        return self.ids_in_z_order(np.flatnonzero(mask))
+
+    def query_rect(self, bounds: Bounds) -> List[BlockHandle]:
+        return self.handles_for(self.query_rect_ids(bounds))
+
+    def _ids(self, handles: Optional[Sequence]) -> "np.ndarray":
+        if handles is None:
+            return self.live_ids()
+        if isinstance(handles, np.ndarray):
+            return handles
+        return np.fromiter((h.id for h in handles), dtype=np.int64, count=len(handles))
+
+    def translate(self, dx: float, dy: float, handles: Optional[Sequence] = None) -> None:
+        """Move many blocks at once (all live blocks when handles is None)."""
+        ids = self._ids(handles)
+        self.x[ids] += dx
+        self.y[ids] += dy
+
+    def clamp(self, bounds: Bounds, handles: Optional[Sequence] = None) -> None:
+        """Pull blocks inside bounds, like clamp_to_canvas() does for one rect."""
+        left, top, width, height = bounds
+        ids = self._ids(handles)
+        x = np.maximum(np.trunc(self.x[ids]), left)
+        y = np.maximum(np.trunc(self.y[ids]), top)
+        w, h = self.w[ids], self.h[ids]
+        self.x[ids] = np.where(x + w > left + width, left + width - w, x)
+        self.y[ids] = np.where(y + h > top + height, top + height - h, y)
+
+    def all_handles(self) -> List[BlockHandle]:
+        """Live blocks, bottom to top (the order they are drawn in)."""
+        return self.handles_for(self.ids_in_z_order())
@@ -0,0 +1,250 @@
+"""
+Turns the blocks on the canvas into runnable model.py chains.
+
+Blocks link up by position: a block whose top edge sits within LINK_GAP
+pixels of another block's bottom edge, and roughly under it, comes next
+in that block's chain. Every canvas block owns one model stage (model.Echo
+or model.Cat) and every chain gets a StandardIn/StandardOut pair. When a
+block is dropped, moved or removed, only its old and new neighbours are
+looked up again (through the canvas spatial index), and only the chains
+they belong to are marked for rewiring. A chain's model objects are wired
+when it is first previewed or run. Re-linking just sets output_destination,
+so pipeline_compiler recompiles nothing but the edited part of each chain.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import model
+
+LINK_GAP = 12  # max vertical distance between a block's bottom and the next block's top
+
+Bounds = Tuple[int, int, int, int]
+LinkKey = Tuple[int, Bounds, Bounds]  # (score, upper bounds, lower bounds)
+
+# Model stage for each UI block label. Blocks carry no argument (path/text) yet,
+# so every stage passes its input through.
+MODEL_STAGES = {
+    "Echo": model.Echo,
+    "Cat": model.Cat,
+}
+
+
+def _link_key(upper, lower) -> Optional[LinkKey]:
+    """
+    How well lower fits under upper (smaller is better), or None if it does
+    not. Equal scores are ordered by the blocks' bounds, so the incremental
+    linker and rebuild() settle every tie the same way.
+    """
+    upper_bounds, lower_bounds = upper.get_bounds(), lower.get_bounds()
+    ux, uy, uw, uh = upper_bounds
+    lx, ly, _, _ = lower_bounds
+    dy = abs(ly - (uy + uh))
+    dx = abs(lx - ux)
+    if dy > LINK_GAP or dx > uw // 2:
+        return None
+    return (dy + dx, upper_bounds, lower_bounds)
+
+
+class CanvasCompiler:
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.next: Dict[object, object] = {}
+        self.prev: Dict[object, object] = {}
+        self.stages: Dict[object, model.Command] = {}
+        # head block -> (StandardIn, StandardOut) of its chain, wired on first use
+        self.chain_io: Dict[object, Tuple[model.StandardIn, model.StandardOut]] = {}
+        self.stale: Set = set()  # heads whose chain changed since it was last wired
+        # blocks whose links may have changed since take_relinked(); None after rebuild()
+        self.relinked: Optional[Set] = set()
+
+    def _candidates(self, block, below: bool) -> List:
+        x, y, w, h = block.get_bounds()
+        if below:
+            band = (x - w, y + h - LINK_GAP, 3 * w, 2 * LINK_GAP + 1)
+        else:
+            # Bounds are half-open: a block ending LINK_GAP above y has its last row at y - LINK_GAP - 1
+            band = (x - w, y - LINK_GAP - 1, 3 * w, 2 * LINK_GAP + 2)
+        return [b for b in self.canvas.index.query_rect(band) if b is not block]
+
+    def _ranked(self, block, below: bool) -> List[Tuple[LinkKey, object]]:
+        """Blocks that could follow (below) or precede block, best fit first."""
+        ranked = []
+        for c in self._candidates(block, below):
+            key = _link_key(block, c) if below else _link_key(c, block)
+            if key is not None:
+                ranked.append((key, c))
+        ranked.sort(key=lambda item: item[0])
+        return ranked
+
+    def _unlink(self, block) -> Set:
+        freed = set()
+        n = self.next.pop(block, None)
+        if n is not None:
+            self.prev.pop(n, None)
+            freed.add(n)
+        p = self.prev.pop(block, None)
+        if p is not None:
+            self.next.pop(p, None)
+            freed.add(p)
+        return freed
+
+    def _link(self, upper, lower, key: LinkKey, queue: List, touched: Set) -> bool:
+        """Link upper -> lower unless either side already has a closer partner; True if linked."""
+        old_prev = self.prev.get(lower)
+        if old_prev is not None and old_prev is not upper and _link_key(old_prev, lower) <= key:
+            return False
+        old_next = self.next.get(upper)
+        if old_next is not None and old_next is not lower and _link_key(upper, old_next) <= key:
+            return False
+        # Both ends are free or held by a worse fit: take them, and let the losers look again
+        if old_prev is not None and old_prev is not upper:
+            del self.next[old_prev]
+            queue.append(old_prev)
+            touched.add(old_prev)
+        if old_next is not None and old_next is not lower:
+            del self.prev[old_next]
+            queue.append(old_next)
+            touched.add(old_next)
+        self.next[upper] = lower
+        self.prev[lower] = upper
+        touched.add(lower)
+        touched.add(upper)
+        return True
+
+    def update(self, block) -> None:
+        """block was dropped or moved: relink it and its old and new neighbours."""
+        self._relink([block])
+
+    def remove(self, block) -> None:
+        """block left the canvas (deleted or picked up for dragging)."""
+        freed = self._unlink(block)
+        self.stages.pop(block, None)
+        self.chain_io.pop(block, None)
+        self.stale.discard(block)
+        if self.relinked is not None:
+            self.relinked.add(block)
+        self._relink(freed)
+
+    def _relink(self, blocks: Iterable) -> None:
+        index = self.canvas.index
+        touched: Set = set()
+        queue: List = []
+        for b in blocks:
+            touched.add(b)
+            touched |= self._unlink(b)
+        queue.extend(b for b in touched if b in index)
+        # Each queued block takes, per side, the best partner it can have that beats its
+        # current one. Every link taken beats the ones it displaces (whose blocks are
+        # queued again), so this ends where rebuild()'s best-first pass does.
+        while queue:
+            b = queue.pop()
+            if b not in index:
+                continue
+            succ = self.next.get(b)
+            current = _link_key(b, succ) if succ is not None else None
+            for key, succ in self._ranked(b, below=True):
+                if current is not None and key >= current or self._link(b, succ, key, queue, touched):
+                    break
+            pred = self.prev.get(b)
+            current = _link_key(pred, b) if pred is not None else None
+            for key, pred in self._ranked(b, below=False):
+                if current is not None and key >= current or self._link(pred, b, key, queue, touched):
+                    break
+        self._invalidate(touched)
+        if self.relinked is not None:
+            self.relinked |= touched
+
+    def _invalidate(self, blocks: Iterable) -> None:
+        """Mark the chains containing blocks for rewiring on their next use."""
+        index = self.canvas.index
+        for b in blocks:
+            if b not in index or b in self.prev:
+                # Gone, or no longer starts a chain
+                self.chain_io.pop(b, None)
+                self.stale.discard(b)
+            if b in index:
+                self.stale.add(self.head_of(b))
+
+    def rebuild(self) -> None:
+        """Link every block on the canvas from scratch, e.g. after loading a workspace."""
+        blocks = self.canvas.get_commands()
+        bounds = [b.get_bounds() for b in blocks]
+        # Block tops bucketed by (row, column), so each block checks only nearby tops
+        # (buckets are sized so that each search window spans at most 2x2 of them)
+        row_h = 2 * LINK_GAP + 1
+        col_w = max(1, max((w for _, _, w, _ in bounds), default=1))
+        tops: Dict[Tuple[int, int], List[int]] = {}
+        for i, (x, y, _, _) in enumerate(bounds):
+            tops.setdefault((y // row_h, x // col_w), []).append(i)
+        pairs = []
+        for i, (x, y, w, h) in enumerate(bounds):
+            bottom = y + h
+            reach = w // 2
+            for row in range((bottom - LINK_GAP) // row_h, (bottom + LINK_GAP) // row_h + 1):
+                for col in range((x - reach) // col_w, (x + reach) // col_w + 1):
+                    for j in tops.get((row, col), ()):
+                        lx, ly = bounds[j][0], bounds[j][1]
+                        dy, dx = abs(ly - bottom), abs(lx - x)
+                        if dy <= LINK_GAP and dx <= reach and j != i:
+                            pairs.append(((dy + dx, bounds[i], bounds[j]), i, j))
+        pairs.sort(key=lambda pair: pair[0])
+        self.next, self.prev, self.chain_io = {}, {}, {}
+        self.stale = set()
+        self.relinked = None
+        live = set(blocks)
+        self.stages = {b: s for b, s in self.stages.items() if b in live}
+        for _, i, j in pairs:
+            upper, lower = blocks[i], blocks[j]
+            if upper not in self.next and lower not in self.prev:
+                self.next[upper] = lower
+                self.prev[lower] = upper
+
+    def take_relinked(self) -> Optional[Set]:
+        """Blocks whose links changed since the last call (None: possibly all of them)."""
+        relinked, self.relinked = self.relinked, set()
+        return relinked
+
+    def head_of(self, block):
+        prev = self.prev
+        while block in prev:
+            block = prev[block]
+        return block
+
+    def _stage(self, block) -> model.Command:
+        stage = self.stages.get(block)
+        if stage is None:
+            stage_type = MODEL_STAGES.get(block.label, model.Echo)
+            stage = self.stages[block] = stage_type(None, "")
+        return stage
+
+    def _wire(self, head) -> model.StandardIn:
+        """Point output_destination along the chain starting at head."""
+        io = self.chain_io.get(head)
+        if io is None:
+            out = model.StandardOut()
+            io = self.chain_io[head] = (model.StandardIn(out), out)
+        elif head not in self.stale:
+            return io[0]
+        self.stale.discard(head)
+        stdin, stdout = io
+        stage = self._stage(head)
+        if stdin.output_destination is not stage:
+            stdin.output_destination = stage
+        block = head
+        while True:
+            nxt = self.next.get(block)
+            target = self._stage(nxt) if nxt is not None else stdout
+            if stage.output_destination is not target:
+                stage.output_destination = target
+            if nxt is None:
+                return stdin
+            block, stage = nxt, target
+
+    def chain_for(self, block) -> Optional[model.StandardIn]:
+        """The runnable chain (its StandardIn) that block belongs to."""
+        if block not in self.canvas.index:
+            return None
+        return self._wire(self.head_of(block))
+
+    def chains(self) -> List[model.StandardIn]:
+        """Every chain on the canvas, wiring any that are not up to date."""
+        return [self._wire(b) for b in self.canvas.get_commands() if b not in self.prev]
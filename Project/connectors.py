@@ -0,0 +1,127 @@
+"""
+Connector lines between linked canvas blocks.
+
+Each link the CanvasCompiler knows about becomes an edge from the bottom
+centre of the upper block to the top centre of the lower one. Edge
+geometry is cached, and refresh() only recomputes the edges touching
+blocks the compiler relinked since the last call. The edges are drawn in
+one pass onto a transparent surface the size of the canvas panel. That
+surface is rebuilt only when an edge or the view changes, and every frame
+just blits it once.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+
+import pygame
+
+from spatial_index import SpatialGrid
+
+Bounds = Tuple[int, int, int, int]
+Point = Tuple[float, float]
+Edge = Tuple[object, object]  # (upper block, lower block)
+
+
+def edge_geometry(upper, lower) -> Tuple[Point, Point]:
+    ux, uy, uw, uh = upper.get_bounds()
+    lx, ly, lw, _ = lower.get_bounds()
+    return (ux + uw / 2, uy + uh), (lx + lw / 2, ly)
+
+
+class ConnectorLayer:
+    def __init__(self, color, width: int = 3):
+        self.color = color
+        self.width = width
+        self.edges: Dict[Edge, Tuple[Point, Point]] = {}
+        self.by_block: Dict[object, Set[Edge]] = {}
+        self.index: SpatialGrid[Edge] = SpatialGrid()
+        self.version = 0
+        self.surface: Optional[pygame.Surface] = None
+        self.surface_key = None
+
+    def __len__(self) -> int:
+        return len(self.edges)
+
+    def _bounds(self, geometry: Tuple[Point, Point]) -> Bounds:
+        (x0, y0), (x1, y1) = geometry
+        pad = self.width
+        left, top = int(min(x0, x1)) - pad, int(min(y0, y1)) - pad
+        return (left, top, int(abs(x1 - x0)) + 2 * pad + 1, int(abs(y1 - y0)) + 2 * pad + 1)
+
+    def _add(self, edge: Edge, changed: List[Bounds]) -> None:
+        if edge in self.edges:
+            return
+        geometry = self.edges[edge] = edge_geometry(*edge)
+        bounds = self._bounds(geometry)
+        self.index.insert(edge, bounds)
+        for block in edge:
+            self.by_block.setdefault(block, set()).add(edge)
+        changed.append(bounds)
+
+    def _remove(self, edge: Edge, changed: List[Bounds]) -> None:
+        changed.append(self.index.bounds_of(edge))
+        self.index.remove(edge)
+        del self.edges[edge]
+        for block in edge:
+            edges = self.by_block.get(block)
+            if edges is not None:
+                edges.discard(edge)
+                if not edges:
+                    del self.by_block[block]
+
+    def refresh(self, compiler) -> Optional[List[Bounds]]:
+        """
+        Bring the edges in line with the compiler's links. Returns the world
+        bounds of the edges that appeared or disappeared, or None if every
+        edge was rebuilt.
+        """
+        blocks = compiler.take_relinked()
+        if blocks is not None and not blocks:
+            return []
+        changed: List[Bounds] = []
+        if blocks is None:
+            self.edges.clear()
+            self.by_block.clear()
+            self.index.clear()
+            for edge in compiler.next.items():
+                self._add(edge, changed)
+            self.version += 1
+            return None
+        for block in blocks:
+            for edge in list(self.by_block.get(block, ())):
+                self._remove(edge, changed)
+        index = compiler.canvas.index
+        for block in blocks:
+            if block not in index:
+                continue
+            lower = compiler.next.get(block)
+            if lower is not None:
+                self._add((block, lower), changed)
+            upper = compiler.prev.get(block)
+            if upper is not None:
+                self._add((upper, block), changed)
+        if changed:
+            self.version += 1
+        return changed
+
+    def layer(self, view) -> pygame.Surface:
+        """The connectors in view, drawn onto a panel-sized transparent surface."""
+        key = (view.x, view.y, view.level, view.panel.size, self.version)
+        if key != self.surface_key:
+            if self.surface is None or self.surface.get_size() != view.panel.size:
+                self.surface = pygame.Surface(view.panel.size, pygame.SRCALPHA)
+            surf = self.surface
+            surf.fill((0, 0, 0, 0))
+            ox, oy = view.panel.topleft
+            to_screen = view.to_screen
+            width = max(1, round(self.width * view.zoom))
+            line = pygame.draw.line
+            for edge in self.index.query_rect(view.visible_bounds()):
+                start, end = self.edges[edge]
+                sx, sy = to_screen(*start)
+                ex, ey = to_screen(*end)
+                line(surf, self.color, (sx - ox, sy - oy), (ex - ox, ey - oy), width)
+            self.surface_key = key
+        return self.surface
+
+    def draw(self, surf: pygame.Surface, view) -> None:
+        if self.edges:
+            surf.blit(self.layer(view), view.panel.topleft)
@@ -0,0 +1,52 @@
+from typing import List, Optional
+import pygame
+
+
+class DirtyTracker:
+    """
+    Collects screen rectangles that changed since the last frame.
+
+    When nothing is marked, take() returns an empty list and the frame can
+    skip both drawing and the display upload. mark_all() (or too many
+    pending rectangles) falls back to a full redraw, signalled by None.
+    """
+
+    def __init__(self, screen_rect: pygame.Rect, max_rects: int = 32, pad: int = 2):
+        self.screen_rect = pygame.Rect(screen_rect)
+        self.max_rects = max_rects
+        self.pad = pad
+        self.rects: List[pygame.Rect] = []
+        self.full = True
+
+    def add(self, rect: pygame.Rect) -> None:
+        if self.full:
+            return
+        r = pygame.Rect(rect).inflate(self.pad * 2, self.pad * 2).clip(self.screen_rect)
+        if r.w > 0 and r.h > 0:
+            self.rects.append(r)
+
+    def mark_all(self) -> None:
+        self.full = True
+        self.rects.clear()
+
+    def has_changes(self) -> bool:
+        return self.full or bool(self.rects)
+
+    def take(self) -> Optional[List[pygame.Rect]]:
+        """Return merged dirty rects (None means redraw everything) and reset."""
+        if self.full:
+            self.full = False
+            self.rects.clear()
+            return None
+        merged: List[pygame.Rect] = []
+        for r in self.rects:
+            # Fold overlapping rects together so each pixel is redrawn once
+            i = r.collidelist(merged)
+            while i != -1:
+                r = r.union(merged.pop(i))
+                i = r.collidelist(merged)
+            merged.append(r)
+        self.rects.clear()
+        if len(merged) > self.max_rects:
+            return [merged[0].unionall(merged[1:])]
+        return merged
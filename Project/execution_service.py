@@ -0,0 +1,168 @@
+"""
+Runs pipelines off the UI thread.
+
+Jobs run on a small thread pool, by default as subprocess pipelines (see
+pipeline_runner), so the work happens in other processes and the worker
+thread mostly waits on pipes. Workers report back by appending JobEvents
+to a deque, whose append/popleft are atomic in CPython and need no lock.
+The UI calls drain() once per frame. Jobs can be cancelled at any time.
+submit() compiles the chain on the caller's thread and the worker runs a
+private copy of those ops, so later edits to the chain do not reach a
+queued or running job. Each job can carry its own output sink, which
+keeps the outputs of overlapping runs of one chain apart.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from typing import BinaryIO, Deque, Dict, List, NamedTuple, Optional, Sequence, Union
+
+from model import Command, StandardOut, chain_from_ops, run_stages
+from pipeline_compiler import Op, compile_chain
+from pipeline_runner import run_pipeline
+
+PROGRESS_INTERVAL = 0.05  # seconds between progress events per job
+PREVIEW_BYTES = 64 * 1024  # partial output forwarded to the UI per job
+
+
+class JobEvent(NamedTuple):
+    job_id: int
+    kind: str  # "started", "progress", "output", "done", "cancelled" or "error"
+    data: object
+
+    def describe(self) -> str:
+        """One-line status text for the UI."""
+        if self.kind == "started":
+            return f"Job {self.job_id} running: {self.data}"
+        if self.kind == "progress":
+            return f"Job {self.job_id}: {self.data:,} bytes"
+        if self.kind == "output":
+            return f"Job {self.job_id}: output received"
+        if self.kind == "done":
+            return f"Job {self.job_id} done ({self.data:,} bytes)"
+        if self.kind == "cancelled":
+            return f"Job {self.job_id} cancelled"
+        return f"Job {self.job_id} failed: {self.data}"
+
+
+class Job:
+    def __init__(self, job_id: int, ops: Sequence[Op], command: str, input: Union[bytes, None],
+                 sink: Optional[BinaryIO] = None):
+        self.id = job_id
+        self.ops = tuple(ops)  # the chain as it was when submitted
+        self.command = command
+        self.input = input
+        self.sink = sink  # where the output goes (None: it is only reported as events)
+        self.cancel_event = threading.Event()
+        self.status = "queued"
+        self.bytes_out = 0
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "error")
+
+
+class _EventSink:
+    """Wraps a job's output sink and reports what passes through it as events."""
+
+    def __init__(self, service: "ExecutionService", job: Job, inner):
+        self.service = service
+        self.job = job
+        self.inner = inner
+        self.previewed = 0
+        self.last_progress = 0.0
+
+    def write(self, chunk: bytes) -> None:
+        if self.inner is not None:
+            self.inner.write(chunk)
+        job = self.job
+        job.bytes_out += len(chunk)
+        if self.previewed < PREVIEW_BYTES:
+            part = chunk[:PREVIEW_BYTES - self.previewed]
+            self.previewed += len(part)
+            self.service.post(job.id, "output", part)
+        now = time.perf_counter()
+        if now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.service.post(job.id, "progress", job.bytes_out)
+
+
+class ExecutionService:
+    def __init__(self, max_workers: int = 2, use_subprocess: bool = True):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self.use_subprocess = use_subprocess
+        self.events: Deque[JobEvent] = deque()
+        self.jobs: Dict[int, Job] = {}
+        self.ids = count(1)
+
+    def post(self, job_id: int, kind: str, data: object = None) -> None:
+        self.events.append(JobEvent(job_id, kind, data))
+
+    def submit(self, head: Command, input: Optional[bytes] = None, sink: Optional[BinaryIO] = None) -> Job:
+        """
+        Queue the chain starting at head as it is now; its output goes to
+        sink, else to the chain's StandardOut.
+        """
+        compiled = compile_chain(head)
+        if sink is None and isinstance(compiled.stages[-1], StandardOut):
+            sink = compiled.stages[-1]
+        job = Job(next(self.ids), compiled.ops, compiled.command, input, sink)
+        self.jobs[job.id] = job
+        job.future = self.pool.submit(self._run, job)
+        return job
+
+    def cancel(self, job: Job) -> None:
+        job.cancel_event.set()
+
+    def cancel_all(self) -> None:
+        for job in self.jobs.values():
+            job.cancel_event.set()
+
+    def busy(self) -> bool:
+        """True while any job is running or has events the UI has not drained yet."""
+        return bool(self.events) or any(not job.finished for job in self.jobs.values())
+
+    def drain(self, limit: Optional[int] = None) -> List[JobEvent]:
+        """Take pending events (at most limit); call once per frame from the UI thread."""
+        out = []
+        events = self.events
+        while events and (limit is None or len(out) < limit):
+            event = events.popleft()
+            if event.kind in ("done", "cancelled", "error"):
+                self.jobs.pop(event.job_id, None)
+            out.append(event)
+        return out
+
+    def shutdown(self) -> None:
+        self.cancel_all()
+        self.pool.shutdown(wait=True)
+
+    def _run(self, job: Job) -> None:
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+            self.post(job.id, "cancelled", 0)
+            return
+        job.status = "running"
+        self.post(job.id, "started", job.command)
+        # A chain of this job's own, built from the submitted ops (ending in a fresh StandardOut)
+        head = chain_from_ops(job.ops)
+        sink = _EventSink(self, job, job.sink)
+        try:
+            if self.use_subprocess:
+                result = run_pipeline(head, job.input, cancel=job.cancel_event, sink=sink)
+                cancelled = result.cancelled
+            else:
+                cancelled = False
+                for chunk in run_stages(head.stages()[:-1], [job.input] if job.input else []):
+                    if job.cancel_event.is_set():
+                        cancelled = True
+                        break
+                    sink.write(chunk)
+        except Exception as e:
+            job.status = "error"
+            self.post(job.id, "error", e)
+            return
+        job.status = "cancelled" if cancelled else "done"
+        self.post(job.id, job.status, job.bytes_out)
@@ -1,21 +1,47 @@
+import argparse
 from enum import Enum
+import os
 import sys
-import copy
 from dataclasses import dataclass, field
-from typing import Tuple, List, Optional
+import time
+from typing import Callable, ClassVar, Tuple, List, Optional, Sequence
 import pygame
-
-pygame.init()
-FONT = pygame.font.SysFont("arial",pygame.display.Info().current_w // 50)
+from spatial_index import SpatialGrid
+from dirty_rects import DirtyTracker
+from render_cache import SpriteCache, TextCache
+from block_store import BlockHandle, BlockStore
+from execution_service import ExecutionService, Job
+from canvas_compiler import CanvasCompiler
+from connectors import ConnectorLayer
+from fonts import load_font
+from frame_profiler import NULL_PROFILER, FrameProfiler
+from output_panel import OutputPanel
+from input_trace import InputRecorder
+from history import History
+from selection import Selection, union_bounds
+from snapping import EdgeIndex, Guide, Snap, guide_bounds
+from viewport import Bounds, Viewport, ZOOM_STEP
+from workspace_file import Journal, WorkspaceFile, read_journal, replay, template_rows, write_workspace
+
+# pygame, the window, the font and the layout below are set up by init_app(), not at import
+FONT_NAME = "arial"
+FONT: Optional[pygame.font.Font] = None
 
 # Layout - using fractions for proper scaling
-WINDOW_W, WINDOW_H = pygame.display.Info().current_w - 200, pygame.display.Info().current_h - 200
-print(f"Window size: {WINDOW_W}x{WINDOW_H}")
-
+WINDOW_MARGIN = 200  # Screen pixels left around the window
 CANVAS_FRACTION = 0.7
-CANVAS_W = int(WINDOW_W * CANVAS_FRACTION)
-SANDBOX_W = WINDOW_W - CANVAS_W
+WINDOW_W = WINDOW_H = CANVAS_W = SANDBOX_W = 0
 FPS = 60
+DIRTY_RENDERING = True  # False repaints and flips the whole window every frame
+EVENT_DRIVEN = True  # False polls and ticks at FPS even when idle
+IDLE_TIMEOUT_MS = 250  # Longest time to sleep in event.wait() while idle
+USE_BLOCK_STORE = False  # True keeps canvas blocks in NumPy arrays (StoreCanvas)
+PAN_STEP = 64  # Screen pixels the arrow keys scroll the canvas by
+SNAP_DISTANCE = 8  # Screen pixels within which a dragged block snaps to another block's edge (Alt: off)
+GRID_SIZE = 16  # World pixels; blocks not aligned to an edge snap to this grid (0: no grid)
+PROFILE_FRAMES = False  # True times each phase of the main loop (F3 toggles the HUD, F4 writes the CSV)
+PROFILE_CSV = "frame_profile.csv"
+PROFILE_PHASES = ("wait", "events", "hit_test", "update", "draw", "flip", "tick")
 
 # Template positioning constants (as fractions of sandbox)
 TEMPLATE_X_MARGIN = 0.1  # 10% margin from left edge of sandbox
@@ -24,11 +50,11 @@ TEMPLATE_SPACING = 0.15  # 15% of window height between templates
 TEMPLATE_WIDTH_FRACTION = 0.7  # Template width as fraction of sandbox width
 TEMPLATE_HEIGHT_FRACTION = 0.08  # Template height as fraction of window height
 
-# Derived template dimensions
-TEMPLATE_W = int(SANDBOX_W * TEMPLATE_WIDTH_FRACTION)
-TEMPLATE_H = int(WINDOW_H * TEMPLATE_HEIGHT_FRACTION)
-TEMPLATE_X = CANVAS_W + int(SANDBOX_W * TEMPLATE_X_MARGIN)
-TEMPLATE_Y_SPACING = int(WINDOW_H * TEMPLATE_SPACING)
+OUTPUT_Y_START = 0.45  # Job output panel starts 45% down the sandbox
+OUTPUT_SCROLL_LINES = 3  # Lines per mouse wheel step over the output panel
+
+# Derived template dimensions (see set_layout())
+TEMPLATE_W = TEMPLATE_H = TEMPLATE_X = TEMPLATE_Y_SPACING = 0
 
 # Colors
 BG = pygame.Color("#F0F0F0")
@@ -38,10 +64,62 @@ SANDBOX_BG = pygame.Color("#EDEDED")
 ECHO_COLOR = pygame.Color("#4CAF50")
 CAT_COLOR = pygame.Color("#FF9800")
 TEMPLATE_BORDER = pygame.Color("#666666")
+CONNECTOR_COLOR = pygame.Color("#333333")
+SELECT_COLOR = pygame.Color("#1E88E5")
+BAND_COLOR = pygame.Color("#1E88E5")
+GUIDE_COLOR = pygame.Color("#E91E63")
+OUTPUT_BG = pygame.Color("white")
+TEXT_COLOR = pygame.Color("black")
 DRAG_ALPHA = 200
 
-screen = pygame.display.set_mode((WINDOW_W, WINDOW_H))
+screen: Optional[pygame.Surface] = None
 clock = pygame.time.Clock()
+TEXT_CACHE = TextCache()
+SPRITE_CACHE = SpriteCache()
+
+
+def set_font(font: pygame.font.Font) -> None:
+    """Swap the UI font and drop text rendered with the old one."""
+    global FONT
+    if FONT is not None:
+        TEXT_CACHE.invalidate(FONT)
+    SPRITE_CACHE.invalidate()
+    FONT = font
+
+
+def set_layout(window_w: int, window_h: int) -> None:
+    """Size the window and derive the canvas, sandbox and template dimensions from it."""
+    global WINDOW_W, WINDOW_H, CANVAS_W, SANDBOX_W
+    global TEMPLATE_W, TEMPLATE_H, TEMPLATE_X, TEMPLATE_Y_SPACING
+    WINDOW_W, WINDOW_H = window_w, window_h
+    CANVAS_W = int(WINDOW_W * CANVAS_FRACTION)
+    SANDBOX_W = WINDOW_W - CANVAS_W
+    TEMPLATE_W = int(SANDBOX_W * TEMPLATE_WIDTH_FRACTION)
+    TEMPLATE_H = int(WINDOW_H * TEMPLATE_HEIGHT_FRACTION)
+    TEMPLATE_X = CANVAS_W + int(SANDBOX_W * TEMPLATE_X_MARGIN)
+    TEMPLATE_Y_SPACING = int(WINDOW_H * TEMPLATE_SPACING)
+
+
+def init_app() -> pygame.Surface:
+    """
+    Start the display and font modules, open the window and load the UI
+    font. Does nothing if the window is already open. Only the pygame
+    modules the editor uses are started (no audio or joystick), and the
+    font file is found through the on-disk cache in fonts.py.
+    """
+    global screen
+    if screen is not None:
+        return screen
+    start = time.perf_counter()
+    pygame.display.init()
+    pygame.font.init()
+    info = pygame.display.Info()
+    set_layout(info.current_w - WINDOW_MARGIN, info.current_h - WINDOW_MARGIN)
+    set_font(load_font(FONT_NAME, info.current_w // 50))
+    screen = pygame.display.set_mode((WINDOW_W, WINDOW_H))
+    print(f"Window size: {WINDOW_W}x{WINDOW_H}, started in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return screen
+
 
 class Origin(Enum):
     TEMPLATE = 1
@@ -65,81 +143,249 @@ class Canvas(Section):
     def __init__(self, x: int, y: int, w: int, h: int):
         super().__init__(x, y, w, h)
         self.commands = []
+        # Spatial index kept in sync with self.commands (list order == z-order)
+        self.index: SpatialGrid["Command"] = SpatialGrid()
 
-    def append_command(self, cmd: "Command") -> None:
+    def append_command(self, cmd: "Command") -> "Command":
+        """Put cmd on top of the canvas; returns the block as stored."""
         self.commands.append(cmd)
+        self.index.insert(cmd, cmd.get_bounds())
+        return cmd
 
     def remove_command(self, cmd: "Command") -> None:
-        if cmd in self.commands:
+        if cmd in self.index:
+            self.index.remove(cmd)
             self.commands.remove(cmd)
 
+    def move_command(self, cmd: "Command", x: float, y: float) -> None:
+        """Reposition a block that is already on the canvas."""
+        cmd.x, cmd.y = x, y
+        if cmd in self.index:
+            self.index.update(cmd, cmd.get_bounds())
+
+    def command_at(self, px: int, py: int) -> Optional["Command"]:
+        """Topmost canvas block under the point, or None."""
+        return self.index.query_point(px, py)
+
     def get_commands(self) -> List["Command"]:
         return self.commands
 
+    def append_commands(self, cmds: List["Command"]) -> List["Command"]:
+        """Put many blocks on top, in order; returns them as stored."""
+        return [self.append_command(cmd) for cmd in cmds]
+
+    def remove_commands(self, cmds: List["Command"]) -> None:
+        """remove_command() for a group, rebuilding the draw list once."""
+        gone = {cmd for cmd in cmds if cmd in self.index}
+        for cmd in gone:
+            self.index.remove(cmd)
+        self.commands = [cmd for cmd in self.commands if cmd not in gone]
+
+    def translate_commands(self, cmds: List["Command"], dx: float, dy: float) -> None:
+        """Move a group of blocks by the same offset."""
+        for cmd in cmds:
+            self.move_command(cmd, cmd.x + dx, cmd.y + dy)
+
+    def load_blocks(self, types: List[type], columns) -> List["Command"]:
+        """Add blocks from workspace file columns; returns them in column order."""
+        blocks = [types[t](x, y, w, h) for x, y, w, h, t in
+                  zip(columns.x, columns.y, columns.w, columns.h, columns.type)]
+        for block in blocks:
+            self.append_command(block)
+        return blocks
+
+
+class StoreCanvas(Canvas):
+    """
+    Canvas backed by a BlockStore: blocks are NumPy rows reached through
+    handles, and the store itself answers the index queries.
+    """
+    def __init__(self, x: int, y: int, w: int, h: int):
+        Section.__init__(self, x, y, w, h)
+        self.index = BlockStore()
+        self.commands = None  # z-ordered handle list, rebuilt lazily
+
+    def append_command(self, cmd: "Command") -> "Command":
+        self.commands = None
+        return self.index.add_command(cmd)
+
+    def remove_command(self, cmd: "Command") -> None:
+        # Hide rather than free, so a handle being dragged stays valid
+        if cmd in self.index:
+            self.index.hide(cmd)
+            self.commands = None
+
+    def move_command(self, cmd: "Command", x: float, y: float) -> None:
+        cmd.x, cmd.y = x, y
+
+    def append_commands(self, cmds: List["Command"]) -> List["Command"]:
+        own = [cmd for cmd in cmds if isinstance(cmd, BlockHandle) and cmd.store is self.index]
+        if len(own) != len(cmds):
+            return super().append_commands(cmds)
+        self.index.show_many(own)
+        self.commands = None
+        return own
+
+    def remove_commands(self, cmds: List["Command"]) -> None:
+        self.index.hide_many([cmd for cmd in cmds if cmd in self.index])
+        self.commands = None
+
+    def translate_commands(self, cmds: List["Command"], dx: float, dy: float) -> None:
+        self.index.translate(dx, dy, cmds)
+
+    def get_commands(self) -> List["Command"]:
+        if self.commands is None:
+            self.commands = self.index.all_handles()
+        return self.commands
+
+    def load_blocks(self, types: List[type], columns) -> List["Command"]:
+        self.commands = None
+        return self.index.extend(types, columns.type, columns.x, columns.y, columns.w, columns.h)
+
 
 class Sandbox(Section):
     def __init__(self, x: int, y: int, w: int, h: int):
         super().__init__(x, y, w, h)
         self.templates = []
+        self.index: SpatialGrid["Command"] = SpatialGrid()
 
     def append_template(self, cmd: "Command") -> None:
         self.templates.append(cmd)
+        self.index.insert(cmd, cmd.get_bounds())
+
+    def template_at(self, px: int, py: int) -> Optional["Command"]:
+        """Template under the point, or None."""
+        return self.index.query_point(px, py)
 
     def get_templates(self) -> List["Command"]:
         return self.templates
 
+    def clear_templates(self) -> None:
+        self.templates = []
+        self.index.clear()
+
+
+@dataclass(frozen=True, eq=False)
+class BlockStyle:
+    """
+    Look of one block type, shared by every block of that type.
+    Compared and hashed by identity, so it doubles as a sprite cache key.
+    The colour is kept as an RGBA tuple: a shared pygame.Color could be
+    changed in place under every block of the type and its cached sprites.
+    """
+    color: Tuple[int, int, int, int]
+    label: str
+
+    def __post_init__(self):
+        object.__setattr__(self, "color", tuple(pygame.Color(self.color)))
+
 
 class Command:
     """Parent command type."""
+    __slots__ = ("x", "y", "w", "h")
+    style: ClassVar[BlockStyle] = BlockStyle(pygame.Color("gray"), "Command")
+
     def __init__(self, x: float, y: float, w: int, h: int):
         self.x = x
         self.y = y
         self.w = w
         self.h = h
-        self.color = pygame.Color("gray")
-        self.label = "Command"
+
+    @property
+    def color(self) -> Tuple[int, int, int, int]:
+        return self.style.color
+
+    @property
+    def label(self) -> str:
+        return self.style.label
 
     def get_rect(self) -> pygame.Rect:
         return pygame.Rect(int(self.x), int(self.y), self.w, self.h)
 
+    def get_bounds(self) -> Tuple[int, int, int, int]:
+        """Same as get_rect() but as a plain tuple, for indexing."""
+        return (int(self.x), int(self.y), self.w, self.h)
+
     def clone(self) -> "Command":
-        return copy.deepcopy(self)
+        """Copy the geometry; the style stays shared with the original."""
+        new = self.__class__.__new__(self.__class__)
+        new.x, new.y, new.w, new.h = self.x, self.y, self.w, self.h
+        return new
 
 
 class Echo(Command):
-    def __init__(self, x: float, y: float, w: int, h: int):
-        super().__init__(x, y, w, h)
-        self.color = pygame.Color("#4CAF50")
-        self.label = "Echo"
+    __slots__ = ()
+    style = BlockStyle(ECHO_COLOR, "Echo")
 
 
 class Cat(Command):
-    def __init__(self, x: float, y: float, w: int, h: int):
-        super().__init__(x, y, w, h)
-        self.color = pygame.Color("#FF9800")
-        self.label = "Cat"
+    __slots__ = ()
+    style = BlockStyle(CAT_COLOR, "Cat")
+
+
+# Block classes by label, for loading workspace files
+BLOCK_TYPES = {cls.style.label: cls for cls in (Echo, Cat)}
+
+
+def block_type(label: str) -> type:
+    return BLOCK_TYPES.get(label, Command)
+
+
+def layout_templates(sandbox: Sandbox, types: Sequence[type]) -> None:
+    """Replace the sandbox templates with one block of each type, stacked down the pane."""
+    sandbox.clear_templates()
+    template_y = int(WINDOW_H * TEMPLATE_Y_START)
+    for kind in types:
+        sandbox.append_template(kind(x=TEMPLATE_X, y=template_y, w=TEMPLATE_W, h=TEMPLATE_H))
+        template_y += TEMPLATE_Y_SPACING
+
+
+def open_workspace(path: str, canvas: Canvas, sandbox: Sandbox) -> Journal:
+    """
+    Load a workspace file (and its journal) into canvas and sandbox, or
+    create it from the current templates. Returns the journal that
+    autosaves further edits.
+    """
+    if not os.path.exists(path):
+        return Journal(path, write_workspace(path, [], template_rows(sandbox.get_templates())))
+    with WorkspaceFile(path) as ws:
+        if len(ws.templates.x):
+            # Saved by type only: lay them out for this window
+            layout_templates(sandbox, [block_type(label) for label, *_ in ws.rows(ws.templates)])
+        blocks = canvas.load_blocks([block_type(label) for label in ws.labels], ws.blocks)
+        generation = ws.generation
+    records = read_journal(path, generation)
+    replay(records, blocks,
+           add=lambda r: canvas.append_command(block_type(r.label)(r.x, r.y, r.w, r.h)),
+           move=lambda block, r: canvas.move_command(block, r.x, r.y),
+           remove=canvas.remove_command)
+    journal = Journal(path, generation, len(records))
+    journal.bind(blocks)
+    return journal
 
 
 def is_point_in_canvas(px: int, py: int) -> bool:
     return 0 <= px < CANVAS_W and 0 <= py < WINDOW_H
 
 
-def clamp_to_canvas(rect: pygame.Rect) -> pygame.Rect:
+def clamp_to_canvas(rect: pygame.Rect, area: Optional[Bounds] = None) -> pygame.Rect:
+    """Move rect inside area (world bounds; by default the unscrolled canvas)."""
+    left, top, width, height = area if area is not None else (0, 0, CANVAS_W, WINDOW_H)
     r = rect.copy()
-    if r.left < 0:
-        r.left = 0
-    if r.top < 0:
-        r.top = 0
-    if r.right > CANVAS_W:
-        r.right = CANVAS_W
-    if r.bottom > WINDOW_H:
-        r.bottom = WINDOW_H
+    if r.left < left:
+        r.left = left
+    if r.top < top:
+        r.top = top
+    if r.right > left + width:
+        r.right = left + width
+    if r.bottom > top + height:
+        r.bottom = top + height
     return r
 
 
 
 def discard_if_in_sandbox(dragging: Optional[Command], drag_origin: Origin, 
-                         mx: int, my: int, canvas_blocks: List[Command]) -> Optional[Command]:
+                         mx: int, my: int, canvas: Canvas) -> Optional[Command]:
     """
     If dragging is a clone from a template and the mouse is outside the canvas when released,
     discard the duplicate by returning None. Otherwise return the original dragging object.
@@ -147,36 +393,80 @@ def discard_if_in_sandbox(dragging: Optional[Command], drag_origin: Origin,
     if dragging is None:
         return None
     if drag_origin == Origin.TEMPLATE and not is_point_in_canvas(mx, my):
-        if dragging in canvas_blocks:
-            canvas_blocks.remove(dragging)
+        canvas.remove_command(dragging)
         return None
     return dragging
 
 
-def draw_command(command: Command, surf: pygame.Surface, alpha: Optional[int] = None) -> None:
-    """Draw a command block with optional transparency."""
-    rect = command.get_rect()
-    color = command.color
+def build_block_sprite(command: Command, alpha: Optional[int] = None) -> pygame.Surface:
+    """Compose a block (fill, border, label) into its own surface."""
+    sprite = pygame.Surface((command.w, command.h), pygame.SRCALPHA)
+    rect = sprite.get_rect()
+    color = pygame.Color(command.color)
     
     if alpha is not None:
-        s = pygame.Surface((rect.w, rect.h), pygame.SRCALPHA)
-        c = (*color[:3], alpha)
-        s.fill(c)
-        surf.blit(s, rect.topleft)
+        sprite.fill((*color[:3], alpha))
     else:
-        pygame.draw.rect(surf, color, rect, border_radius=8)
+        pygame.draw.rect(sprite, color, rect, border_radius=8)
     
-    pygame.draw.rect(surf, BORDER, rect, width=2, border_radius=8)
+    pygame.draw.rect(sprite, BORDER, rect, width=2, border_radius=8)
     
-    text = FONT.render(command.label, True, pygame.Color("black"))
+    text = TEXT_CACHE.render(FONT, command.label, TEXT_COLOR)
     txt_r = text.get_rect(center=rect.center)
-    surf.blit(text, txt_r)
+    sprite.blit(text, txt_r)
+    return sprite
+
+
+def block_sprite(command: Command, alpha: Optional[int] = None, level: int = 0) -> pygame.Surface:
+    """Cached sprite for a block, keyed by (style, size, alpha, zoom level)."""
+    key = (command.style, command.w, command.h, alpha, level)
+    sprite = SPRITE_CACHE.get(key)
+    if sprite is None:
+        if level == 0:
+            sprite = build_block_sprite(command, alpha)
+        else:
+            # Scale the full-size sprite once per zoom level
+            zoom = ZOOM_STEP ** level
+            size = (max(1, round(command.w * zoom)), max(1, round(command.h * zoom)))
+            sprite = pygame.transform.smoothscale(block_sprite(command, alpha), size)
+        sprite = SPRITE_CACHE.put(key, sprite)
+    return sprite
+
+
+def draw_command(command: Command, surf: pygame.Surface, alpha: Optional[int] = None,
+                 view: Optional[Viewport] = None) -> None:
+    """Draw a command block with optional transparency, through view if given."""
+    if view is None:
+        surf.blit(block_sprite(command, alpha), (int(command.x), int(command.y)))
+    else:
+        surf.blit(block_sprite(command, alpha, view.level), view.to_screen(command.x, command.y))
 
 
-def draw_scene(canvas: Canvas, sandbox: Sandbox, canvas_blocks: List[Command], 
-               dragging: Optional[Command], drag_origin: Origin) -> None:
-    """Draw the entire scene including canvas, sandbox, and all commands."""
-    # Draw background
+def draw_layer(commands: List[Command], surf: pygame.Surface, alpha: Optional[int] = None,
+               view: Optional[Viewport] = None) -> None:
+    """Draw many blocks bottom to top with one batched blits() call."""
+    if view is None:
+        surf.blits([(block_sprite(c, alpha), (int(c.x), int(c.y))) for c in commands], doreturn=False)
+    else:
+        level, to_screen = view.level, view.to_screen
+        surf.blits([(block_sprite(c, alpha, level), to_screen(c.x, c.y)) for c in commands], doreturn=False)
+
+
+def build_group_sprite(blocks: List[Command], bounds: Bounds, view: Viewport) -> pygame.Surface:
+    """Render a group of blocks into one surface covering their bounding box."""
+    sprite = pygame.Surface(view.screen_rect(bounds).size, pygame.SRCALPHA)
+    ox, oy = view.to_screen(bounds[0], bounds[1])
+    level, to_screen = view.level, view.to_screen
+    blits = []
+    for c in blocks:
+        sx, sy = to_screen(c.x, c.y)
+        blits.append((block_sprite(c, None, level), (sx - ox, sy - oy)))
+    sprite.blits(blits, doreturn=False)
+    return sprite
+
+
+def draw_background(canvas: Canvas, sandbox: Sandbox) -> None:
+    """Draw the window background, both panels and their titles."""
     screen.fill(BG)
 
     # Draw canvas area
@@ -190,132 +480,524 @@ def draw_scene(canvas: Canvas, sandbox: Sandbox, canvas_blocks: List[Command],
     pygame.draw.rect(screen, BORDER, sandbox_rect, width=3)
 
     # Labels
-    lbl_canvas = FONT.render("Canvas", True, pygame.Color("black"))
+    lbl_canvas = TEXT_CACHE.render(FONT, "Canvas", TEXT_COLOR)
     screen.blit(lbl_canvas, (10, 10))
-    lbl_sandbox = FONT.render("Sandbox", True, pygame.Color("black"))
+    lbl_sandbox = TEXT_CACHE.render(FONT, "Sandbox", TEXT_COLOR)
     screen.blit(lbl_sandbox, (CANVAS_W + 20, 10))
 
-    # Draw template blocks in sandbox
-    for t in sandbox.get_templates():
-        draw_command(t, screen)
 
-    # Draw blocks on canvas
-    for b in canvas_blocks:
-        draw_command(b, screen)
+def draw_instructions() -> None:
+    instruct = TEXT_CACHE.render(FONT, "Drag a block from the Sandbox into the Canvas. If dropped outside, it'll disappear.",
+                                 TEXT_COLOR)
+    screen.blit(instruct, (CANVAS_W + 10, WINDOW_H - 30))
+
+
+def status_rect() -> pygame.Rect:
+    """Strip along the bottom of the canvas used for job status text."""
+    return pygame.Rect(10, WINDOW_H - 30, CANVAS_W - 20, 24)
+
+
+def output_rect() -> pygame.Rect:
+    """Lower part of the sandbox where the output of the last job run is shown."""
+    top = int(WINDOW_H * OUTPUT_Y_START)
+    return pygame.Rect(CANVAS_W + 10, top, SANDBOX_W - 20, WINDOW_H - 40 - top)
+
+
+def draw_status(status: str) -> None:
+    if status:
+        screen.blit(TEXT_CACHE.render(FONT, status, TEXT_COLOR), status_rect().topleft)
+
+
+def draw_guides(guides: Sequence[Guide], surf: pygame.Surface, view: Viewport) -> None:
+    for start, end in guides:
+        pygame.draw.line(surf, GUIDE_COLOR, view.to_screen(*start), view.to_screen(*end))
+
+
+def snap_drag(edges: EdgeIndex, bounds: Bounds, view: Viewport, mods: int) -> Snap:
+    """Snap for a dragged block (or group) at bounds; holding Alt (in mods) turns snapping off."""
+    if mods & pygame.KMOD_ALT:
+        return Snap(0, 0, [])
+    return edges.snap(bounds, SNAP_DISTANCE / view.zoom, GRID_SIZE)
+
+
+def replace_guides(dirty: DirtyTracker, view: Viewport, old: List[Guide], new: List[Guide]) -> List[Guide]:
+    """Mark the old and new guide lines for redraw; returns new."""
+    for guide in old + new:
+        dirty.add(view.screen_rect(guide_bounds(guide)))
+    return new
+
+
+def draw_scene(canvas: Canvas, sandbox: Sandbox, view: Viewport,
+               dragging: Optional[Command], drag_origin: Origin, status: str = "",
+               connectors: Optional[ConnectorLayer] = None, selection: Optional[Selection] = None,
+               guides: Sequence[Guide] = (), output: Optional[OutputPanel] = None) -> None:
+    """Draw the entire scene: panels, templates and the canvas blocks in view."""
+    draw_background(canvas, sandbox)
+
+    # Draw template blocks in sandbox
+    draw_layer(sandbox.get_templates(), screen)
+    if output is not None:
+        output.draw(screen)
+
+    # Draw only the canvas blocks inside the viewport
+    screen.set_clip(canvas.get_rect())
+    draw_layer(canvas.index.query_rect(view.visible_bounds()), screen, view=view)
+    if connectors is not None:
+        connectors.draw(screen, view)
+    if selection is not None:
+        selection.draw(screen, view)
+    draw_guides(guides, screen, view)
+    screen.set_clip(None)
 
     # Draw dragging object on top (semi-transparent if from template)
     if dragging is not None:
         alpha = DRAG_ALPHA if drag_origin == Origin.TEMPLATE else None
-        draw_command(dragging, screen, alpha=alpha)
+        draw_command(dragging, screen, alpha=alpha, view=view)
+
+    draw_instructions()
+    draw_status(status)
+
+
+def draw_region(canvas: Canvas, sandbox: Sandbox, region: pygame.Rect, view: Viewport,
+                dragging: Optional[Command], drag_origin: Origin, status: str = "",
+                connectors: Optional[ConnectorLayer] = None, selection: Optional[Selection] = None,
+                guides: Sequence[Guide] = (), output: Optional[OutputPanel] = None) -> None:
+    """Redraw only what overlaps region (in screen pixels), using the spatial indexes to find blocks."""
+    screen.set_clip(region)
+    draw_background(canvas, sandbox)
+
+    bounds = (region.x, region.y, region.w, region.h)
+    draw_layer(sandbox.index.query_rect(bounds), screen)
+    if output is not None and output.rect.colliderect(region):
+        output.draw(screen)
+    canvas_region = region.clip(canvas.get_rect())
+    if canvas_region.w and canvas_region.h:
+        screen.set_clip(canvas_region)
+        draw_layer(canvas.index.query_rect(view.world_bounds(canvas_region)), screen, view=view)
+        if connectors is not None:
+            connectors.draw(screen, view)
+        if selection is not None:
+            selection.draw(screen, view)
+        draw_guides(guides, screen, view)
+        screen.set_clip(region)
+
+    if dragging is not None and view.screen_rect(dragging.get_bounds()).colliderect(region):
+        alpha = DRAG_ALPHA if drag_origin == Origin.TEMPLATE else None
+        draw_command(dragging, screen, alpha=alpha, view=view)
 
-    # Instructions
-    instruct = FONT.render("Drag a block from the Sandbox into the Canvas. If dropped outside, it'll disappear.", 
-                          True, pygame.Color("black"))
-    screen.blit(instruct, (CANVAS_W + 10, WINDOW_H - 30))
+    draw_instructions()
+    draw_status(status)
+    screen.set_clip(None)
 
 
-def main():
+def wait_for_events(active: bool) -> List[pygame.event.Event]:
+    """
+    Poll the queue while something is animating; otherwise sleep in
+    event.wait() until input arrives (or IDLE_TIMEOUT_MS passes).
+    """
+    if active or not EVENT_DRIVEN:
+        return pygame.event.get()
+    first = pygame.event.wait(IDLE_TIMEOUT_MS)
+    if first.type == pygame.NOEVENT:
+        return []
+    return [first] + pygame.event.get()
+
+
+def coalesce_motion(events: List[pygame.event.Event]) -> List[pygame.event.Event]:
+    """Keep only the last MOUSEMOTION of each uninterrupted run of motion events."""
+    out: List[pygame.event.Event] = []
+    for ev in events:
+        if ev.type == pygame.MOUSEMOTION and out and out[-1].type == pygame.MOUSEMOTION:
+            out[-1] = ev
+        else:
+            out.append(ev)
+    return out
+
+
+def main(workspace_path: Optional[str] = None, record_path: Optional[str] = None,
+         source: Optional[Callable[[bool], List[pygame.event.Event]]] = None):
+    """
+    Run the editor. record_path writes the input to a trace file;
+    source replaces the event queue (e.g. an input_trace.TraceReplayer),
+    in which case frames are not capped at FPS.
+    """
+    init_app()
     # Initialize canvas and sandbox
-    canvas = Canvas(x=0, y=0, w=CANVAS_W, h=WINDOW_H)
+    canvas_type = StoreCanvas if USE_BLOCK_STORE else Canvas
+    canvas = canvas_type(x=0, y=0, w=CANVAS_W, h=WINDOW_H)
     sandbox = Sandbox(x=CANVAS_W, y=0, w=SANDBOX_W, h=WINDOW_H)
 
     # Create template blocks with automatic spacing
-    template_y = int(WINDOW_H * TEMPLATE_Y_START)
-    
-    echo_template = Echo(x=TEMPLATE_X, y=template_y, w=TEMPLATE_W, h=TEMPLATE_H)
-    sandbox.append_template(echo_template)
-    
-    template_y += TEMPLATE_Y_SPACING
-    cat_template = Cat(x=TEMPLATE_X, y=template_y, w=TEMPLATE_W, h=TEMPLATE_H)
-    sandbox.append_template(cat_template)
+    layout_templates(sandbox, [Echo, Cat])
 
     # State variables
-    canvas_blocks: List[Command] = []
     dragging: Optional[Command] = None
     drag_offset: Tuple[float, float] = (0.0, 0.0)
     drag_origin: Origin = Origin.TEMPLATE
     original_pos: Tuple[float, float] = (0.0, 0.0)
+    dirty = DirtyTracker(screen.get_rect())
+    # Blocks are in world coordinates; view maps them onto the canvas panel
+    view = Viewport(canvas.get_rect())
+    pan_from: Optional[Tuple[int, int]] = None  # last mouse position while panning
+    # Pipelines run in the background; their events are drained once per frame
+    service = ExecutionService()
+    status = ""
+    # Model chains follow the canvas layout; only chains touched by an edit are relinked
+    compiler = CanvasCompiler(canvas)
+    last_placed = None
+    history = History()
+    # Lines between linked blocks, refreshed from the compiler's relinks once per frame
+    connectors = ConnectorLayer(CONNECTOR_COLOR)
+    # Rubber-band selection; a selected group is dragged as one sprite
+    selection = Selection(SELECT_COLOR, BAND_COLOR)
+    # Sorted block edges for snapping, updated wherever the compiler is; guides show the current snap
+    edges = EdgeIndex()
+    guides: List[Guide] = []
+    # Output of the last chain run, spilled to disk and drawn a screenful at a time
+    output = OutputPanel(output_rect(), load_font("monospace", 14), TEXT_COLOR, OUTPUT_BG, TEMPLATE_BORDER)
+    output_job: Optional[Job] = None
+    # Edits are journalled to the workspace file in the background
+    journal = open_workspace(workspace_path, canvas, sandbox) if workspace_path else None
+    if journal is not None:
+        compiler.rebuild()
+        edges.rebuild(canvas.get_commands())
+    # Per-phase frame timings; the null profiler's calls do nothing
+    profiler = FrameProfiler(PROFILE_PHASES, FPS) if PROFILE_FRAMES else NULL_PROFILER
+    hud_font = load_font("monospace", 14) if PROFILE_FRAMES else None
+    recorder = InputRecorder(record_path, (WINDOW_W, WINDOW_H)) if record_path else None
+    # A replayed session only knows the pointer and the modifier keys from its events
+    mx, my = pygame.mouse.get_pos() if source is None else (0, 0)
+    mods = pygame.key.get_mods() if source is None else 0
 
     running = True
     while running:
-        mx, my = pygame.mouse.get_pos()
-        
-        for ev in pygame.event.get():
+        profiler.begin_frame()
+        # Pointer interactions that redraw on every motion event
+        interacting = (dragging is not None or pan_from is not None or selection.dragging
+                       or selection.band_start is not None)
+        active = interacting or dirty.has_changes() or service.busy()
+        if source is None:
+            mx, my = pygame.mouse.get_pos()
+            events = wait_for_events(active)
+        else:
+            events = source(active)
+        if recorder is not None and events:
+            recorder.record(events)
+        events = coalesce_motion(events)
+        profiler.mark("wait")
+
+        for ev in events:
+            if hasattr(ev, "pos"):
+                mx, my = ev.pos
+            if ev.type in (pygame.KEYDOWN, pygame.KEYUP):
+                mods = ev.mod
+
             if ev.type == pygame.QUIT:
                 running = False
+
+            elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_ESCAPE:
+                service.cancel_all()
+
+            elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_s and ev.mod & pygame.KMOD_CTRL:
+                if journal is not None:
+                    journal.compact(canvas.get_commands(), sandbox.get_templates())
+                    status = f"Saved {workspace_path}"
+                    dirty.add(status_rect())
+
+            elif (ev.type == pygame.KEYDOWN and ev.key in (pygame.K_z, pygame.K_y)
+                  and ev.mod & pygame.KMOD_CTRL and dragging is None and not selection.dragging):
+                # Ctrl+Z undoes, Ctrl+Y or Ctrl+Shift+Z redoes
+                if ev.key == pygame.K_y or ev.mod & pygame.KMOD_SHIFT:
+                    step = history.redo(canvas)
+                else:
+                    step = history.undo(canvas)
+                if step and selection.blocks:
+                    selection.blocks = [block for block in selection.blocks if block in canvas.index]
+                placed, gone = [], []
+                for block, before in step:
+                    dirty.add(view.screen_rect(before))
+                    if block in canvas.index:
+                        placed.append(block)
+                        compiler.update(block)
+                        dirty.add(view.screen_rect(block.get_bounds()))
+                        if journal is not None:
+                            journal.moved(block)
+                    else:
+                        gone.append(block)
+                        compiler.remove(block)
+                        if journal is not None:
+                            journal.removed(block)
+                edges.update_many(placed, canvas.get_commands)
+                edges.remove_many(gone, canvas.get_commands)
+
+            elif ev.type == pygame.KEYDOWN and ev.key in (pygame.K_F3, pygame.K_F4) and profiler.enabled:
+                if ev.key == pygame.K_F3:
+                    profiler.hud_shown = not profiler.hud_shown
+                    if profiler.hud_rect is not None:
+                        dirty.add(profiler.hud_rect)
+                else:
+                    rows = profiler.export_csv(PROFILE_CSV)
+                    status = f"Wrote {rows} frames to {PROFILE_CSV}"
+                    dirty.add(status_rect())
+
+            elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_RETURN:
+                # Run the chain of the block placed last
+                chain = compiler.chain_for(last_placed) if last_placed is not None else None
+                if chain is not None:
+                    # The panel shows one job: stop the previous one before dropping its output
+                    if output_job is not None:
+                        service.cancel(output_job)
+                    output_job = service.submit(chain, sink=output.start())
+                    dirty.add(output.rect)
+
+            elif ev.type == pygame.KEYDOWN and ev.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                output.page(-1 if ev.key == pygame.K_PAGEUP else 1)
+
+            elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_END:
+                output.scroll_to(output.line_count())
+
+            elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_HOME and ev.mod & pygame.KMOD_CTRL:
+                output.scroll_to(0)
+
+            elif ev.type == pygame.KEYDOWN and ev.key in (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN):
+                dx = PAN_STEP if ev.key == pygame.K_LEFT else -PAN_STEP if ev.key == pygame.K_RIGHT else 0
+                dy = PAN_STEP if ev.key == pygame.K_UP else -PAN_STEP if ev.key == pygame.K_DOWN else 0
+                view.pan(dx, dy)
+                dirty.mark_all()
+
+            elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_HOME:
+                view = Viewport(canvas.get_rect())
+                dirty.mark_all()
+
+            elif ev.type == pygame.MOUSEWHEEL and output.rect.collidepoint(mx, my):
+                output.scroll(-ev.y * OUTPUT_SCROLL_LINES)
+
+            elif ev.type == pygame.MOUSEWHEEL:
+                # Zoom around the cursor
+                if is_point_in_canvas(mx, my) and view.zoom_at(ev.y, mx, my):
+                    if selection.dragging:
+                        selection.sprite = build_group_sprite(selection.blocks, selection.bounds, view)
+                    dirty.mark_all()
+
+            elif ev.type == pygame.MOUSEBUTTONDOWN and ev.button in (2, 3) and is_point_in_canvas(mx, my):
+                # Middle or right button drags the view
+                pan_from = (mx, my)
+
+            elif ev.type == pygame.MOUSEBUTTONUP and ev.button in (2, 3):
+                pan_from = None
+
+            elif ev.type == pygame.WINDOWEXPOSED:
+                # Window contents were lost (uncovered/restored), repaint it all
+                dirty.mark_all()
                 
+            elif ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1 and output.scrollbar_rect().collidepoint(mx, my):
+                output.scrolling = True
+                output.scroll_to_mouse(my)
+
             elif ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
                 # Check templates first (right pane)
-                clicked_template = None
-                for t in sandbox.get_templates():
-                    if t.get_rect().collidepoint(ev.pos):
-                        clicked_template = t
-                        break
-                        
+                profiler.mark("events")
+                clicked_template = sandbox.template_at(*ev.pos)
+                profiler.mark("hit_test")
+
                 if clicked_template:
                     # Create duplicate which will follow the mouse until dropped
                     dragging = clicked_template.clone()
                     drag_origin = Origin.TEMPLATE
                     # Center the block under the mouse
-                    dragging.x = mx - dragging.w // 2
-                    dragging.y = my - dragging.h // 2
-                    drag_offset = (mx - dragging.x, my - dragging.y)
+                    wx, wy = view.to_world(mx, my)
+                    dragging.x = wx - dragging.w // 2
+                    dragging.y = wy - dragging.h // 2
+                    drag_offset = (wx - dragging.x, wy - dragging.y)
+                    dirty.add(view.screen_rect(dragging.get_bounds()))
                 else:
                     # Check canvas blocks (allow moving existing blocks)
                     if is_point_in_canvas(mx, my):
-                        hit = None
-                        for b in reversed(canvas_blocks):
-                            if b.get_rect().collidepoint(ev.pos):
-                                hit = b
-                                break
-                        if hit:
+                        wx, wy = view.to_world(mx, my)
+                        profiler.mark("events")
+                        hit = canvas.command_at(wx, wy)
+                        profiler.mark("hit_test")
+                        if hit and hit in selection and len(selection) > 1:
+                            # Drag the whole selection
+                            selection.sprite = build_group_sprite(selection.blocks, union_bounds(selection.blocks),
+                                                                  view)
+                            selection.start_drag(canvas, wx, wy)
+                            for block in selection.blocks:
+                                compiler.remove(block)
+                            edges.remove_many(selection.blocks, canvas.get_commands)
+                            dirty.add(view.screen_rect(selection.bounds))
+                        elif not hit:
+                            # Empty canvas: start a rubber band
+                            for bounds in selection.clear():
+                                dirty.add(view.screen_rect(bounds))
+                            selection.start_band(mx, my)
+                        else:
+                            for bounds in selection.clear():
+                                dirty.add(view.screen_rect(bounds))
                             dragging = hit
                             drag_origin = Origin.CANVAS
                             original_pos = (hit.x, hit.y)
-                            drag_offset = (mx - hit.x, my - hit.y)
+                            drag_offset = (wx - hit.x, wy - hit.y)
                             # Remove from list while dragging (will re-add on drop)
-                            canvas_blocks.remove(hit)
+                            canvas.remove_command(hit)
+                            compiler.remove(hit)
+                            edges.remove(hit)
+                            dirty.add(view.screen_rect(hit.get_bounds()))
 
             elif ev.type == pygame.MOUSEMOTION:
+                if output.scrolling:
+                    output.scroll_to_mouse(my)
+                if pan_from is not None:
+                    # Use positions, not ev.rel: coalesced motion events drop the earlier deltas
+                    view.pan(mx - pan_from[0], my - pan_from[1])
+                    pan_from = (mx, my)
+                    dirty.mark_all()
+                if selection.band_start is not None:
+                    for rect in selection.update_band(mx, my):
+                        dirty.add(rect)
+                elif selection.dragging:
+                    for bounds in selection.drag_to(*view.to_world(mx, my), view.visible_bounds()):
+                        dirty.add(view.screen_rect(bounds))
+                    snap = snap_drag(edges, selection.drag_bounds(), view, mods)
+                    dirty.add(view.screen_rect(selection.shift(snap.dx, snap.dy)))
+                    guides = replace_guides(dirty, view, guides, snap.guides)
                 if dragging is not None:
-                    dragging.x = mx - drag_offset[0]
-                    dragging.y = my - drag_offset[1]
+                    dirty.add(view.screen_rect(dragging.get_bounds()))
+                    wx, wy = view.to_world(mx, my)
+                    dragging.x = wx - drag_offset[0]
+                    dragging.y = wy - drag_offset[1]
+                    if is_point_in_canvas(mx, my):
+                        snap = snap_drag(edges, dragging.get_bounds(), view, mods)
+                        x, y, _, _ = dragging.get_bounds()
+                        dragging.x, dragging.y = x + snap.dx, y + snap.dy
+                        guides = replace_guides(dirty, view, guides, snap.guides)
+                    else:
+                        guides = replace_guides(dirty, view, guides, [])
+                    dirty.add(view.screen_rect(dragging.get_bounds()))
                     
             elif ev.type == pygame.MOUSEBUTTONUP and ev.button == 1:
+                output.scrolling = False
+                guides = replace_guides(dirty, view, guides, [])
+                if selection.band_start is not None:
+                    for rect in selection.finish_band(canvas, view):
+                        dirty.add(rect)
+                    for block in selection.blocks:
+                        dirty.add(view.screen_rect(block.get_bounds()))
+                elif selection.dragging:
+                    dirty.add(view.screen_rect(selection.drag_bounds()))
+                    dx, dy = selection.drop(canvas)
+                    history.translated(selection.blocks, dx, dy)
+                    for block in selection.blocks:
+                        compiler.update(block)
+                        if journal is not None:
+                            journal.moved(block)
+                    edges.update_many(selection.blocks, canvas.get_commands)
+                    dirty.add(view.screen_rect(union_bounds(selection.blocks)))
                 if dragging is not None:
+                    dirty.add(view.screen_rect(dragging.get_bounds()))
                     # Check if block should be discarded
-                    dragging = discard_if_in_sandbox(dragging, drag_origin, mx, my, canvas_blocks)
+                    dragging = discard_if_in_sandbox(dragging, drag_origin, mx, my, canvas)
                     
                     if dragging is not None:
                         if drag_origin == Origin.TEMPLATE:
                             # New clone from template
                             if is_point_in_canvas(mx, my):
-                                rect = clamp_to_canvas(dragging.get_rect())
+                                rect = clamp_to_canvas(dragging.get_rect(), view.visible_bounds())
                                 dragging.x, dragging.y = rect.x, rect.y
-                                canvas_blocks.append(dragging)
+                                dragging = canvas.append_command(dragging)
                         elif drag_origin == Origin.CANVAS:
                             # Existing block being moved
                             if is_point_in_canvas(mx, my):
-                                rect = clamp_to_canvas(dragging.get_rect())
+                                rect = clamp_to_canvas(dragging.get_rect(), view.visible_bounds())
                                 dragging.x, dragging.y = rect.x, rect.y
-                                canvas_blocks.append(dragging)
+                                dragging = canvas.append_command(dragging)
                             else:
                                 # Restore to original position
                                 dragging.x, dragging.y = original_pos
-                                canvas_blocks.append(dragging)
+                                dragging = canvas.append_command(dragging)
+                        if dragging in canvas.index:
+                            if drag_origin == Origin.TEMPLATE:
+                                history.added(dragging)
+                            else:
+                                history.moved(dragging, original_pos)
+                            last_placed = dragging
+                            compiler.update(dragging)
+                            edges.update(dragging)
+                            if journal is not None:
+                                journal.moved(dragging)
+                            status = compiler.chain_for(dragging).make_command()
+                            dirty.add(status_rect())
+                        dirty.add(view.screen_rect(dragging.get_bounds()))
                     
                     dragging = None
                     drag_origin = Origin.TEMPLATE
-
-        # Draw everything
-        draw_scene(canvas, sandbox, canvas_blocks, dragging, drag_origin)
-
-        pygame.display.flip()
-        clock.tick(FPS)
-
+        profiler.mark("events")
+
+        if journal is not None and journal.needs_compaction():
+            journal.compact(canvas.get_commands(), sandbox.get_templates())
+
+        changed = connectors.refresh(compiler)
+        if changed is None:
+            dirty.mark_all()
+        else:
+            for bounds in changed:
+                dirty.add(view.screen_rect(bounds))
+
+        for job_event in service.drain():
+            if job_event.kind != "output":
+                status = job_event.describe()
+                dirty.add(status_rect())
+        if output.poll():
+            dirty.add(output.rect)
+
+        if not DIRTY_RENDERING:
+            dirty.mark_all()
+        if profiler.hud_shown and profiler.hud_rect is not None and (dirty.has_changes() or profiler.hud_due()):
+            # The HUD is translucent: repaint what is under it before drawing it again
+            dirty.add(profiler.hud_rect)
+        profiler.mark("update")
+        regions = dirty.take()
+        if regions is None:
+            # Draw everything
+            draw_scene(canvas, sandbox, view, dragging, drag_origin, status, connectors, selection, guides, output)
+            profiler.draw_hud(screen, hud_font, (CANVAS_W - 8, 8))
+            profiler.mark("draw")
+            pygame.display.flip()
+        elif regions:
+            for region in regions:
+                draw_region(canvas, sandbox, region, view, dragging, drag_origin, status, connectors, selection,
+                            guides, output)
+            hud = profiler.draw_hud(screen, hud_font, (CANVAS_W - 8, 8))
+            if hud is not None:
+                regions.append(hud)
+            profiler.mark("draw")
+            pygame.display.update(regions)
+        profiler.mark("flip")
+        if source is None and (interacting or service.busy() or not EVENT_DRIVEN):
+            # Polling (a drag, a pan, a band select or a job in progress) is capped at the frame rate
+            clock.tick(FPS)
+        profiler.mark("tick")
+        profiler.end_frame()
+
+    if profiler.enabled:
+        profiler.export_csv(PROFILE_CSV)
+    if recorder is not None:
+        recorder.close()
+    service.shutdown()
+    output.close()
+    if journal is not None:
+        journal.close()
     pygame.quit()
     sys.exit()
 
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Block pipeline editor.")
+    parser.add_argument("workspace", nargs="?", help="workspace file to open (created if missing)")
+    parser.add_argument("--record", metavar="PATH", help="record the input to this trace file")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    main(args.workspace, args.record)
@@ -4,6 +4,9 @@
 
 import pygame
 
+from fonts import load_font
+from frame_profiler import NULL_PROFILER, FrameProfiler
+
 # --- constants --- (UPPER_CASE names)
 
 SCREEN_WIDTH = 430
@@ -15,6 +18,9 @@ RED   = (255,   0,   0)
 
 FPS = 30
 
+PROFILE = False  # True times each phase of the loop and writes PROFILE_CSV on exit
+PROFILE_CSV = "frame_profile_clickanddrag.csv"
+
 # --- classses --- (CamelCase names)
 
 # empty
@@ -45,11 +51,16 @@ origin = pygame.rect.Rect(22, 34, 17, 17)
 
 clock = pygame.time.Clock()
 
+profiler = FrameProfiler(("events", "draw", "flip", "tick"), FPS) if PROFILE else NULL_PROFILER
+hud_font = load_font("monospace", 12) if PROFILE else None
+
 running = True
 line = []
 
 while running:
 
+    profiler.begin_frame()
+
     # - events -
 
     for event in pygame.event.get():
@@ -74,6 +85,8 @@ while running:
                 rectangle.x = mouse_x + offset_x
                 rectangle.y = mouse_y + offset_y
 
+    profiler.mark("events")
+
     # - updates (without draws) -
 
     # empty
@@ -85,14 +98,24 @@ while running:
     pygame.draw.rect(screen, RED, rectangle)
     pygame.draw.rect(screen, RED, origin)
 
-    pygame.display.flip()
-
+    # the connector must be drawn before flip(), or it shows up one frame late
     pygame.draw.line(screen, RED, (rectangle.x, rectangle.y), (origin.x, origin.y), 4)
 
+    profiler.draw_hud(screen, hud_font, (SCREEN_WIDTH - 4, 4))
+    profiler.mark("draw")
+
+    pygame.display.flip()
+    profiler.mark("flip")
+
     # - constant game speed / FPS -
 
     clock.tick(FPS)
+    profiler.mark("tick")
+    profiler.end_frame()
 
 # - end -
 
+if profiler.enabled:
+    profiler.export_csv(PROFILE_CSV)
+
 pygame.quit()
@@ -0,0 +1,57 @@
+"""
+Font loading without the system font scan on every launch.
+
+pygame.font.SysFont() has to list the installed fonts (fc-list, the
+registry, ...) before it can open one, and on machines with many fonts
+that dominates startup. resolve_font() does that lookup once per font
+name and keeps the resulting file path in a small JSON file in the user's
+cache directory; later runs open the file directly. A name with no match
+is cached as "" and maps to pygame's bundled default font.
+"""
+import json
+import os
+from typing import Dict, Optional
+
+import pygame
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "block-editor")
+FONT_CACHE = os.path.join(CACHE_DIR, "fonts.json")
+
+
+def _read_cache(path: str) -> Dict[str, str]:
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _write_cache(path: str, cache: Dict[str, str]) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # a read-only home just means resolving again next time
+
+
+def resolve_font(name: str, cache_path: str = FONT_CACHE) -> Optional[str]:
+    """File path of the system font called name (None: use the default font)."""
+    cache = _read_cache(cache_path)
+    path = cache.get(name)
+    if path is not None and (path == "" or os.path.exists(path)):
+        return path or None
+    path = pygame.font.match_font(name)
+    cache[name] = path or ""
+    _write_cache(cache_path, cache)
+    return path
+
+
+def load_font(name: str, size: int, cache_path: str = FONT_CACHE) -> pygame.font.Font:
+    """Like pygame.font.SysFont(name, size), minus the font scan after the first run."""
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame.font.Font(resolve_font(name, cache_path), size)
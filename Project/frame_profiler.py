@@ -0,0 +1,174 @@
+"""
+Per-phase frame timing for the pygame main loops.
+
+The loop calls begin_frame(), then mark(phase) at the end of each phase
+(events, hit_test, draw, flip, tick, ...), then end_frame(). Time between
+marks is added to that phase. Finished frames go into a fixed-size ring
+buffer (one flat array of doubles), so recording allocates nothing. The
+HUD shows p50/p95/p99 of the work time per frame, which is every phase
+except the idle ones (waiting for events, clock.tick), plus how many
+frames went over the frame budget. export_csv() writes the buffered
+frames in order. When profiling is off the loops use NULL_PROFILER, whose
+methods do nothing.
+"""
+import csv
+import math
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pygame
+
+DEFAULT_CAPACITY = 600  # frames kept (10 s at 60 FPS)
+HUD_INTERVAL = 0.5  # seconds between HUD refreshes
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class FrameProfiler:
+    enabled = True
+
+    def __init__(self, phases: Sequence[str], fps: int = 60, capacity: int = DEFAULT_CAPACITY,
+                 idle: Iterable[str] = ("wait", "tick")):
+        self.phases = tuple(phases)
+        self.slots: Dict[str, int] = {p: i for i, p in enumerate(self.phases)}
+        self.work_slots = [i for i, p in enumerate(self.phases) if p not in set(idle)]
+        self.budget = 1.0 / fps
+        self.capacity = capacity
+        self.samples = array("d", bytes(8 * capacity * len(self.phases)))
+        self.frames = 0  # frames recorded so far (the buffer holds the last `capacity`)
+        self.current = [0.0] * len(self.phases)
+        self.last = time.perf_counter()
+        self.hud_shown = True
+        self.hud_time = 0.0
+        self.hud_surface: Optional[pygame.Surface] = None
+        self.hud_rect: Optional[pygame.Rect] = None  # where the HUD was drawn last
+
+    def begin_frame(self) -> None:
+        self.last = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        """Charge the time since the previous mark to phase."""
+        now = time.perf_counter()
+        self.current[self.slots[phase]] += now - self.last
+        self.last = now
+
+    def end_frame(self) -> None:
+        n = len(self.phases)
+        start = (self.frames % self.capacity) * n
+        current = self.current
+        for i in range(n):
+            self.samples[start + i] = current[i]
+            current[i] = 0.0
+        self.frames += 1
+
+    def _rows(self) -> List[Tuple[int, List[float]]]:
+        """(frame number, per-phase seconds) for the buffered frames, oldest first."""
+        n = len(self.phases)
+        count = min(self.frames, self.capacity)
+        first = self.frames - count
+        rows = []
+        for frame in range(first, self.frames):
+            start = (frame % self.capacity) * n
+            rows.append((frame, list(self.samples[start:start + n])))
+        return rows
+
+    def work_times(self) -> List[float]:
+        slots = self.work_slots
+        return [sum(values[i] for i in slots) for _, values in self._rows()]
+
+    def stats(self) -> Dict[str, float]:
+        """Work-time percentiles in milliseconds and the number of frames over budget."""
+        times = sorted(self.work_times())
+        return {
+            "frames": len(times),
+            "p50_ms": percentile(times, 50) * 1000,
+            "p95_ms": percentile(times, 95) * 1000,
+            "p99_ms": percentile(times, 99) * 1000,
+            "dropped": sum(1 for t in times if t > self.budget),
+        }
+
+    def phase_means(self) -> Dict[str, float]:
+        """Mean milliseconds per buffered frame for every phase."""
+        rows = self._rows()
+        if not rows:
+            return {p: 0.0 for p in self.phases}
+        return {p: sum(values[i] for _, values in rows) / len(rows) * 1000 for i, p in enumerate(self.phases)}
+
+    def export_csv(self, path: str) -> int:
+        """Write the buffered frames (milliseconds per phase) to path; returns the row count."""
+        rows = self._rows()
+        slots = self.work_slots
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", *(p + "_ms" for p in self.phases), "work_ms", "over_budget"])
+            for frame, values in rows:
+                work = sum(values[i] for i in slots)
+                writer.writerow([frame, *(f"{v * 1000:.3f}" for v in values), f"{work * 1000:.3f}",
+                                 int(work > self.budget)])
+        return len(rows)
+
+    def hud_lines(self) -> List[str]:
+        s = self.stats()
+        means = self.phase_means()
+        return [
+            f"frame p50 {s['p50_ms']:.1f}  p95 {s['p95_ms']:.1f}  p99 {s['p99_ms']:.1f} ms",
+            f"over budget {s['dropped']}/{s['frames']}",
+            "  ".join(f"{p} {means[p]:.1f}" for p in self.phases),
+        ]
+
+    def hud_due(self) -> bool:
+        """True when the HUD text should be refreshed (at most every HUD_INTERVAL)."""
+        return self.hud_shown and time.perf_counter() - self.hud_time >= HUD_INTERVAL
+
+    def draw_hud(self, surf: pygame.Surface, font: pygame.font.Font, topright: Tuple[int, int],
+                 color=(255, 255, 255), background=(0, 0, 0, 180)) -> Optional[pygame.Rect]:
+        """Draw the overlay (re-rendered at most every HUD_INTERVAL); returns the area it covers."""
+        if not self.hud_shown:
+            return None
+        if self.hud_surface is None or self.hud_due():
+            self.hud_time = time.perf_counter()
+            texts = [font.render(line, True, color) for line in self.hud_lines()]
+            w = max(t.get_width() for t in texts) + 12
+            h = sum(t.get_height() for t in texts) + 8
+            hud = pygame.Surface((w, h), pygame.SRCALPHA)
+            hud.fill(background)
+            y = 4
+            for t in texts:
+                hud.blit(t, (6, y))
+                y += t.get_height()
+            self.hud_surface = hud
+        self.hud_rect = self.hud_surface.get_rect(topright=topright)
+        surf.blit(self.hud_surface, self.hud_rect)
+        return self.hud_rect
+
+
+class NullProfiler:
+    """Stands in for FrameProfiler when profiling is off."""
+    enabled = False
+    hud_shown = False
+    hud_rect = None
+
+    def begin_frame(self) -> None:
+        pass
+
+    def mark(self, phase: str) -> None:
+        pass
+
+    def end_frame(self) -> None:
+        pass
+
+    def hud_due(self) -> bool:
+        return False
+
+    def draw_hud(self, *args, **kwargs) -> None:
+        return None
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,92 @@
+"""
+Undo/redo for canvas edits as a log of operations.
+
+Each step records only what changed: the block, and for a move its old
+and new position (for a group move, the blocks and their shared offset).
+Nothing is copied, so memory grows by one small record per edit (and at
+most HISTORY_LIMIT records are kept). Undo applies the inverse of the last
+record and redo applies it again, each in O(1) besides the canvas' own
+index update (a group step is one bulk move).
+"""
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+HISTORY_LIMIT = 10000
+
+Bounds = Tuple[int, int, int, int]
+
+
+class Edit(NamedTuple):
+    kind: str  # "add", "remove", "move" or "translate" (group move)
+    block: object  # a tuple of blocks for "translate"
+    before: Optional[Tuple[float, float]]  # position before a move
+    after: Optional[Tuple[float, float]]  # position after a move, offset of a translate
+
+
+class History:
+    def __init__(self, limit: int = HISTORY_LIMIT):
+        self.undo_stack: Deque[Edit] = deque(maxlen=limit)
+        self.redo_stack: List[Edit] = []
+
+    def __len__(self) -> int:
+        return len(self.undo_stack)
+
+    def _record(self, edit: Edit) -> None:
+        self.undo_stack.append(edit)
+        self.redo_stack.clear()
+
+    def added(self, block) -> None:
+        self._record(Edit("add", block, None, None))
+
+    def removed(self, block) -> None:
+        self._record(Edit("remove", block, None, None))
+
+    def moved(self, block, before: Tuple[float, float]) -> None:
+        after = (block.x, block.y)
+        if after != tuple(before):
+            self._record(Edit("move", block, tuple(before), after))
+
+    def translated(self, blocks, dx: float, dy: float) -> None:
+        if blocks and (dx or dy):
+            self._record(Edit("translate", tuple(blocks), None, (dx, dy)))
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def undo(self, canvas) -> List[Tuple[object, Bounds]]:
+        """Revert the last edit on canvas; returns (block, its bounds before) per block touched."""
+        if not self.undo_stack:
+            return []
+        edit = self.undo_stack.pop()
+        self.redo_stack.append(edit)
+        return self._apply(canvas, edit, undo=True)
+
+    def redo(self, canvas) -> List[Tuple[object, Bounds]]:
+        """Apply the last undone edit again; returns (block, its bounds before) per block touched."""
+        if not self.redo_stack:
+            return []
+        edit = self.redo_stack.pop()
+        self.undo_stack.append(edit)
+        return self._apply(canvas, edit, undo=False)
+
+    @staticmethod
+    def _apply(canvas, edit: Edit, undo: bool) -> List[Tuple[object, Bounds]]:
+        block = edit.block
+        if edit.kind == "translate":
+            touched = [(b, b.get_bounds()) for b in block]
+            dx, dy = edit.after
+            if undo:
+                dx, dy = -dx, -dy
+            canvas.translate_commands(block, dx, dy)
+            return touched
+        bounds = block.get_bounds()
+        if edit.kind == "move":
+            canvas.move_command(block, *(edit.before if undo else edit.after))
+        elif (edit.kind == "add") == undo:
+            canvas.remove_command(block)
+        else:
+            canvas.append_command(block)
+        return [(block, bounds)]
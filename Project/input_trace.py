@@ -0,0 +1,237 @@
+"""
+Record and replay editor input.
+
+While recording, every batch of events main() reads is appended to a
+trace file: a small header (magic, version, window size) followed by one
+fixed-size record per event (milliseconds since start, type, position and
+up to three event fields). The first record of each batch is flagged, so
+a replay hands main() the same batches in the same order. Only the event
+types the editor reacts to are kept.
+
+Replaying skips the recorded pauses and clock.tick() and runs main()
+under the dummy video driver as fast as it can. The replayer times each
+frame from one batch to the next, so a captured session becomes a
+repeatable throughput and latency benchmark:
+
+    python experiment_add1.py [workspace] --record session.trace
+    python input_trace.py session.trace [--workspace file.blkw] [--output stats.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pygame
+
+from frame_profiler import percentile
+
+TRACE_MAGIC = b"BLKT"
+TRACE_VERSION = 1
+HEADER = struct.Struct("<4sHHII")  # magic, version, reserved, window width, window height
+RECORD = struct.Struct("<IBhhiiI")  # ms since start, type code, x, y, a, b, c
+BATCH_START = 0x80  # set in the type code of the first event of each batch
+FLUSH_BYTES = 1 << 16
+
+# Stable codes for the recorded event types (pygame's own numbers may change between versions)
+EVENT_CODES = {
+    pygame.QUIT: 1,
+    pygame.MOUSEBUTTONDOWN: 2,
+    pygame.MOUSEBUTTONUP: 3,
+    pygame.MOUSEMOTION: 4,
+    pygame.MOUSEWHEEL: 5,
+    pygame.KEYDOWN: 6,
+    pygame.KEYUP: 7,
+}
+EVENT_TYPES = {code: kind for kind, code in EVENT_CODES.items()}
+
+Batch = Tuple[float, List[pygame.event.Event]]  # (seconds since start, events)
+
+
+def encode_event(ev: pygame.event.Event) -> Tuple[int, int, int, int, int]:
+    """The (x, y, a, b, c) fields stored for ev."""
+    if ev.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return (*ev.pos, ev.button, 0, 0)
+    if ev.type == pygame.MOUSEMOTION:
+        buttons = sum(1 << i for i, pressed in enumerate(ev.buttons) if pressed)
+        return (*ev.pos, *ev.rel, buttons)
+    if ev.type == pygame.MOUSEWHEEL:
+        return (0, 0, ev.x, ev.y, 0)
+    if ev.type in (pygame.KEYDOWN, pygame.KEYUP):
+        return (0, 0, ev.key, ev.mod, 0)
+    return (0, 0, 0, 0, 0)
+
+
+def decode_event(kind: int, x: int, y: int, a: int, b: int, c: int) -> pygame.event.Event:
+    if kind in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return pygame.event.Event(kind, pos=(x, y), button=a)
+    if kind == pygame.MOUSEMOTION:
+        return pygame.event.Event(kind, pos=(x, y), rel=(a, b),
+                                  buttons=tuple(bool(c >> i & 1) for i in range(3)))
+    if kind == pygame.MOUSEWHEEL:
+        return pygame.event.Event(kind, x=a, y=b, flipped=False)
+    if kind in (pygame.KEYDOWN, pygame.KEYUP):
+        return pygame.event.Event(kind, key=a, mod=b)
+    return pygame.event.Event(kind)
+
+
+class InputRecorder:
+    def __init__(self, path: str, window_size: Tuple[int, int]):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, 0, *window_size))
+        self.buffer = bytearray()
+        self.start = time.perf_counter()
+        self.count = 0
+
+    def __enter__(self) -> "InputRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def record(self, events: List[pygame.event.Event]) -> None:
+        """Append one batch (the events main() read in one frame)."""
+        ms = int((time.perf_counter() - self.start) * 1000)
+        flag = BATCH_START
+        for ev in events:
+            code = EVENT_CODES.get(ev.type)
+            if code is None:
+                continue
+            self.buffer += RECORD.pack(ms, code | flag, *encode_event(ev))
+            flag = 0
+            self.count += 1
+        if len(self.buffer) >= FLUSH_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_trace(path: str) -> Tuple[Tuple[int, int], List[Batch]]:
+    """The recorded window size and the event batches, in order."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, _, width, height = HEADER.unpack_from(data)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise ValueError(f"{path} is not a version {TRACE_VERSION} input trace")
+    batches: List[Batch] = []
+    end = len(data) - (len(data) - HEADER.size) % RECORD.size  # ignore a torn last record
+    for ms, code, x, y, a, b, c in RECORD.iter_unpack(data[HEADER.size:end]):
+        ev = decode_event(EVENT_TYPES[code & ~BATCH_START], x, y, a, b, c)
+        if code & BATCH_START or not batches:
+            batches.append((ms / 1000, []))
+        batches[-1][1].append(ev)
+    return (width, height), batches
+
+
+class TraceReplayer:
+    """
+    Event source for main(): returns the recorded batches one per frame,
+    then QUIT. The time between two calls is the cost of the frame that
+    handled the earlier batch.
+    """
+
+    def __init__(self, batches: List[Batch]):
+        self.batches = batches
+        self.pos = 0
+        self.frame_times: List[float] = []
+        self.events = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.last: Optional[float] = None
+
+    def __call__(self, active: bool) -> List[pygame.event.Event]:
+        now = time.perf_counter()
+        if self.last is not None:
+            self.frame_times.append(now - self.last)
+        if self.started is None:
+            self.started = now
+        if self.pos >= len(self.batches):
+            self.finished = now
+            self.last = None
+            return [pygame.event.Event(pygame.QUIT)]
+        events = self.batches[self.pos][1]
+        self.pos += 1
+        self.events += len(events)
+        self.last = now
+        return events
+
+    def stats(self) -> Dict[str, float]:
+        times = sorted(self.frame_times)
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        recorded = self.batches[-1][0] - self.batches[0][0] if self.batches else 0.0
+        return {
+            "frames": self.pos,
+            "events": self.events,
+            "elapsed_s": elapsed,
+            "recorded_s": recorded,
+            "events_per_s": self.events / elapsed if elapsed > 0 else 0.0,
+            "frames_per_s": self.pos / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": percentile(times, 50) * 1000,
+            "p95_ms": percentile(times, 95) * 1000,
+            "p99_ms": percentile(times, 99) * 1000,
+            "max_ms": times[-1] * 1000 if times else 0.0,
+        }
+
+
+def replay(trace_path: str, workspace_path: Optional[str] = None) -> Dict[str, float]:
+    """
+    Run main() on a recorded trace and return its timings. The workspace,
+    if any, is copied first so the replay's journal does not touch it.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import experiment_add1 as editor
+    # Opening the window prints its size; keep that off stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        editor.init_app()
+    window_size, batches = read_trace(trace_path)
+    if window_size != (editor.WINDOW_W, editor.WINDOW_H):
+        print(f"warning: trace was recorded in a {window_size[0]}x{window_size[1]} window, "
+              f"replaying in {editor.WINDOW_W}x{editor.WINDOW_H}", file=sys.stderr)
+    replayer = TraceReplayer(batches)
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = None
+        if workspace_path is not None:
+            workspace = os.path.join(tmp, os.path.basename(workspace_path))
+            shutil.copyfile(workspace_path, workspace)
+            if os.path.exists(workspace_path + ".journal"):
+                shutil.copyfile(workspace_path + ".journal", workspace + ".journal")
+        try:
+            editor.main(workspace, source=replayer)
+        except SystemExit:
+            pass
+    return replayer.stats()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay a recorded editor session headless and time it.")
+    parser.add_argument("trace", help="trace file written by experiment_add1.py --record")
+    parser.add_argument("--workspace", help="workspace file to open before replaying (left unchanged)")
+    parser.add_argument("--output", help="write the timings as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    stats = replay(args.trace, args.workspace)
+    for name, value in stats.items():
+        print(f"{name:>14}: {value:.3f}" if isinstance(value, float) else f"{name:>14}: {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(stats, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
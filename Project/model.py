@@ -1,64 +1,223 @@
-import sys
-import math
+import os
+import mmap
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+from pipeline_compiler import CompiledChain, Op, compile_chain
+
+CHUNK_SIZE = 64 * 1024  # bytes handed from one stage to the next
+MMAP_THRESHOLD = 8 * 1024 * 1024  # files at least this big are read through mmap
+
+
+def run_stages(stages: List["Command"], chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Push chunks through stages and yield whatever the last stage emits.
+
+    Works with an explicit stack instead of nested calls, so chains of any
+    length run without touching the recursion limit. Each input chunk is
+    carried all the way down before the next one is read, so at most one
+    chunk per stage is in flight.
+    """
+    n = len(stages)
+    # (stage index the chunks go into, chunk iterator, is it that stage's last input)
+    stack = [(0, iter(chunks), True)]
+    while stack:
+        i, it, last = stack[-1]
+        chunk = next(it, None)
+        if chunk is None:
+            stack.pop()
+            if last and i < n:
+                stack.append((i + 1, stages[i].finish(), True))
+        elif i == n:
+            yield chunk
+        elif chunk:
+            stack.append((i + 1, stages[i].feed(chunk), False))
+
+
+def read_file_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a file's contents chunk by chunk; big files are mapped instead of read."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                for start in range(0, size, chunk_size):
+                    yield mm[start:start + chunk_size]
+        else:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
 
 class Command:
+    # Attributes that change the compiled command; setting one counts as an edit
+    COMPILED_FIELDS = frozenset(("output_destination", "path", "text"))
+    edits = 0  # edits to any stage, so an unchanged chain recompiles in O(1)
+    _rev = 0  # edits to this stage
+
     def __init__(self):
         self.output_destination: Command
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self.COMPILED_FIELDS:
+            object.__setattr__(self, "_rev", self._rev + 1)
+            Command.edits += 1
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        """Consume one input chunk and yield output chunks (default: pass it on)."""
+        yield chunk
+
+    def finish(self) -> Iterator[bytes]:
+        """Called once after the last input chunk; yield any remaining output."""
+        return iter(())
+
+    def stages(self) -> List["Command"]:
+        """This command and everything downstream of it, in order."""
+        chain = []
+        stage: Optional[Command] = self
+        while stage is not None:
+            chain.append(stage)
+            stage = getattr(stage, "output_destination", None)
+        return chain
+
+    def stream(self, chunks: Iterable[bytes] = ()) -> Iterator[bytes]:
+        """Run the chain lazily over chunked input, yielding the final output."""
+        return run_stages(self.stages(), chunks)
+
+    def run(self, chunks: Iterable[bytes] = ()) -> int:
+        """Run the chain to completion (output goes to StandardOut's sink); returns bytes out."""
+        total = 0
+        for chunk in self.stream(chunks):
+            total += len(chunk)
+        return total
+
     def action(self, input) -> str:
-        return self.output_destination.action(input)
-    
+        """Run the chain on one whole value and return (and store) the result."""
+        is_text = isinstance(input, str)
+        data = input.encode() if is_text else (input or b"")
+        out = b"".join(self.stream([data]))
+        result = out.decode() if is_text else out
+        last = self.stages()[-1]
+        if isinstance(last, StandardOut):
+            last.value = result
+        return result
+
+    def op(self) -> Op:
+        """This stage in the compiled intermediate representation."""
+        return Op("pass", "")
+
+    def command_token(self) -> Tuple[str, bool]:
+        """This stage's piece of the shell string, and whether the string stops here."""
+        return ("", False)
+
+    def compile(self) -> CompiledChain:
+        return compile_chain(self)
+
     def make_command(self) -> str:
-        return self.output_destination.make_command()
+        return compile_chain(self).command
 
 class Cat(Command):
     def __init__(self, output: Command, flag_path: str):
         self.output_destination = output
         self.path = flag_path
 
-    def action(self, input) -> str:
-        return self.output_destination.action(input)
-    
-    def make_command(self) -> str:
-        return "cat " + self.path 
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        # `cat FILE` ignores its stdin; a bare `cat` passes it through
+        if not self.path:
+            yield chunk
+
+    def finish(self) -> Iterator[bytes]:
+        if self.path:
+            yield from read_file_chunks(self.path)
+
+    def op(self) -> Op:
+        return Op("cat", self.path)
+
+    def command_token(self) -> Tuple[str, bool]:
+        return ("cat " + self.path, True)
 
 class Echo(Command):
-    def __init__(self, output: Command):
+    def __init__(self, output: Command, text: str = ""):
         self.output_destination = output
+        self.text = text
 
-    def action(self, input) -> str:
-        return self.output_destination.action(input)
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        # With text this is `echo TEXT` (stdin ignored); without, it echoes its input
+        if not self.text:
+            yield chunk
 
-    def make_command(self) -> str:
-        return "echo " + self.output_destination.make_command()
+    def finish(self) -> Iterator[bytes]:
+        if self.text:
+            yield (self.text + "\n").encode()
+
+    def op(self) -> Op:
+        return Op("echo", self.text)
+
+    def command_token(self) -> Tuple[str, bool]:
+        if self.text:
+            return ("echo " + self.text, True)
+        return ("echo ", False)
 
 class StandardIn(Command):
     def __init__(self, output: Command):
         self.output_destination = output
 
-    def action(self, input) -> str:
-        return self.output_destination.action(input)
-    
     def input_received(self, input) -> str:
-        return self.output_destination.action(input)
-    
-    def make_command(self) -> str:
-        return self.output_destination.make_command()
+        return self.action(input)
+
+    def op(self) -> Op:
+        return Op("stdin", "")
 
 class StandardOut(Command):
-    def __init__(self):
+    def __init__(self, sink: Optional[BinaryIO] = None):
         self.value = None
+        self.sink = sink  # optional file-like the streamed output is written to
+        self.bytes_written = 0
 
-    def action(self, input) -> str:
-        self.value = input
-        return input
+    def write(self, chunk: bytes) -> None:
+        """Take one chunk of final output (also used by the subprocess runner)."""
+        self.bytes_written += len(chunk)
+        if self.sink is not None:
+            self.sink.write(chunk)
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        self.write(chunk)
+        yield chunk
+
+    def op(self) -> Op:
+        return Op("stdout", "")
+
+    def command_token(self) -> Tuple[str, bool]:
+        return ("", True)
+
+
+def chain_from_ops(ops: Iterable[Op], output: Optional[Command] = None) -> Command:
+    """Rebuild a runnable chain from compiled ops (the inverse of Command.compile())."""
+    ops = list(ops)
+    if output is None:
+        output = StandardOut()
+    head = output
+    for op in reversed(ops):
+        if op.kind == "cat":
+            head = Cat(head, op.arg)
+        elif op.kind == "echo":
+            head = Echo(head, op.arg)
+        elif op.kind == "stdin":
+            head = StandardIn(head)
+    return head
+
+
+def run_ops(ops: Iterable[Op], input: bytes = b"") -> bytes:
+    """Run compiled ops in this process with the streaming engine and return the output."""
+    return b"".join(chain_from_ops(ops).stream([input]))
 
-    def make_command(self) -> str:
-        return ""
 
-stdout = StandardOut()
-stdin = StandardIn(stdout)
+if __name__ == "__main__":
+    stdout = StandardOut()
+    stdin = StandardIn(stdout)
 
-stdin.output_destination = Echo(Cat(stdout, ""))
+    stdin.output_destination = Echo(Cat(stdout, ""))
 
-print("Command to be executed: " + stdin.make_command())
\ No newline at end of file
+    print("Command to be executed: " + stdin.make_command())
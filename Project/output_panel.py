@@ -0,0 +1,247 @@
+"""
+Scrollable view of a job's output, however large it gets.
+
+SpillFile is the output sink of the job the panel shows. It appends each chunk
+to a temporary file, so the UI never holds the output itself. Its line
+index is sparse: the start of every INDEX_EVERY-th line, plus the start
+of any line that follows a line longer than MAX_LINE_BYTES. Finding a
+line is a bisect in that index and a scan over at most INDEX_EVERY short
+lines, and the index takes a few megabytes for a gigabyte of short lines
+instead of 8 bytes per line. The panel reads the file through an mmap
+(remapped as it grows). It renders only the lines that fit its
+rectangle, each through a small LRU of text surfaces, so jumping anywhere
+(wheel, PageUp/PageDown, Home/End, dragging the scrollbar) costs the
+same whether the output is a kilobyte or a gigabyte. While the view is
+at the bottom it follows new output.
+"""
+import mmap
+import os
+import tempfile
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Optional, Tuple
+
+import pygame
+
+from render_cache import TextCache
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+MAX_LINE_BYTES = 1024  # bytes of a line that are decoded and drawn
+INDEX_EVERY = 64  # lines between two entries of the sparse line index
+TAB = "    "
+
+
+def line_starts(chunk: bytes, base: int) -> array:
+    """Offsets just past each newline in chunk, for a chunk that starts at offset base."""
+    if np is not None:
+        ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10).astype(np.uint64)
+        ends += base + 1
+        return array("Q", ends.tobytes())
+    lengths = (len(part) + 1 for part in chunk.split(b"\n")[:-1])
+    return array("Q", accumulate(lengths, initial=base))[1:]
+
+
+def sparse_starts(starts: array, first_line: int, prev_start: int) -> Tuple[array, array]:
+    """
+    (line numbers, offsets) of the starts worth indexing, for starts of lines
+    first_line, first_line + 1, ... where the line before them began at prev_start.
+    """
+    if np is not None:
+        offsets = np.frombuffer(starts, dtype=np.uint64).astype(np.int64)
+        lines = np.arange(first_line, first_line + len(offsets), dtype=np.int64)
+        lengths = np.diff(offsets, prepend=prev_start)
+        keep = (lines % INDEX_EVERY == 0) | (lengths > MAX_LINE_BYTES)
+        return array("Q", lines[keep].astype(np.uint64).tobytes()), array("Q", offsets[keep].astype(np.uint64).tobytes())
+    kept_lines, kept_offsets = array("Q"), array("Q")
+    for line, start in enumerate(starts, first_line):
+        if line % INDEX_EVERY == 0 or start - prev_start > MAX_LINE_BYTES:
+            kept_lines.append(line)
+            kept_offsets.append(start)
+        prev_start = start
+    return kept_lines, kept_offsets
+
+
+class SpillFile:
+    """File-like sink: output goes to disk, some line starts go into a sparse index."""
+
+    def __init__(self, directory: Optional[str] = None):
+        fd, self.path = tempfile.mkstemp(prefix="block-output-", suffix=".txt", dir=directory)
+        self.file = os.fdopen(fd, "w+b", buffering=0)  # readable too, for the mmap
+        # Sparse index: line numbers (ascending) and where those lines start
+        self.index_lines = array("Q", [0])
+        self.index_offsets = array("Q", [0])
+        self.newlines = 0
+        self.tail = 0  # start of the last line (empty while it is being written)
+        self.size = 0
+        self.map: Optional[mmap.mmap] = None
+        self.mapped = 0
+        self.cursor = (-1, 0)  # (line, start) of the line after the last one read, for sequential reads
+
+    def write(self, chunk: bytes) -> None:
+        """Append a chunk (called from the worker thread)."""
+        try:
+            self.file.write(chunk)
+        except ValueError:
+            return  # closed: the panel has moved on to another job
+        base = self.size
+        # Publish the bytes before the index entries that point into them, and those
+        # (offsets before line numbers, which readers bisect) before the line count
+        self.size += len(chunk)
+        starts = line_starts(chunk, base)
+        if not starts:
+            return
+        lines, offsets = sparse_starts(starts, self.newlines + 1, self.tail)
+        self.index_offsets.extend(offsets)
+        self.index_lines.extend(lines)
+        self.tail = starts[-1]
+        self.newlines += len(starts)
+
+    def line_count(self) -> int:
+        newlines, tail = self.newlines, self.tail
+        return newlines + 1 if self.size > tail else newlines
+
+    def _view(self, size: int) -> Optional[mmap.mmap]:
+        if size > self.mapped:
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapped = len(self.map)
+        return self.map
+
+    def _start(self, i: int, view: mmap.mmap, size: int) -> int:
+        line, start = self.cursor
+        if line != i:
+            entry = bisect_right(self.index_lines, i) - 1
+            line, start = self.index_lines[entry], self.index_offsets[entry]
+            # Lines between index entries are short (a long one gets the next line an entry)
+            while line < i:
+                start = view.find(b"\n", start, size) + 1
+                line += 1
+        return start
+
+    def line(self, i: int) -> bytes:
+        """Line i without its newline (at most MAX_LINE_BYTES of it)."""
+        size = self.size
+        if not size:
+            return b""
+        view = self._view(size)
+        start = self._start(i, view, size)
+        limit = min(size, start + MAX_LINE_BYTES)
+        end = view.find(b"\n", start, limit)
+        if end < 0:
+            end = limit
+            self.cursor = (-1, 0)
+        else:
+            self.cursor = (i + 1, end + 1)
+        return view[start:end]
+
+    def discard(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class OutputPanel:
+    def __init__(self, rect: pygame.Rect, font: pygame.font.Font, color, background, border):
+        self.rect = pygame.Rect(rect)
+        self.font = font
+        self.color = color
+        self.background = background
+        self.border = border
+        self.line_height = font.get_linesize()
+        self.spill: Optional[SpillFile] = None
+        self.top = 0  # first visible line
+        self.follow = True  # keep the newest line in view
+        self.drawn: Tuple[int, int] = (0, 0)  # (top, line count) at the last draw
+        self.lines = TextCache(max_entries=256)
+        self.scrolling = False  # dragging the scrollbar
+
+    @property
+    def rows(self) -> int:
+        return max(1, (self.rect.h - 8) // self.line_height)
+
+    def start(self) -> SpillFile:
+        """Begin showing a new job's output; returns the sink to submit the job with."""
+        if self.spill is not None:
+            self.spill.discard()
+        self.spill = SpillFile()
+        self.top = 0
+        self.follow = True
+        self.lines.invalidate()
+        return self.spill
+
+    def close(self) -> None:
+        if self.spill is not None:
+            self.spill.discard()
+            self.spill = None
+
+    def line_count(self) -> int:
+        return self.spill.line_count() if self.spill is not None else 0
+
+    def _last_top(self, count: int) -> int:
+        return max(0, count - self.rows)
+
+    def scroll_to(self, top: int) -> None:
+        count = self.line_count()
+        self.top = max(0, min(top, self._last_top(count)))
+        self.follow = self.top == self._last_top(count)
+
+    def scroll(self, lines: int) -> None:
+        self.scroll_to(self.top + lines)
+
+    def page(self, pages: int) -> None:
+        self.scroll(pages * (self.rows - 1))
+
+    def scrollbar_rect(self) -> pygame.Rect:
+        return pygame.Rect(self.rect.right - 10, self.rect.y + 2, 8, self.rect.h - 4)
+
+    def scroll_to_mouse(self, my: int) -> None:
+        """Jump so the scrollbar thumb is centred on my."""
+        bar = self.scrollbar_rect()
+        fraction = min(max((my - bar.y) / max(bar.h, 1), 0.0), 1.0)
+        self.scroll_to(int(fraction * self.line_count()) - self.rows // 2)
+
+    def poll(self) -> bool:
+        """Follow new output; True if the panel needs a redraw (new lines or a new scroll position)."""
+        count = self.line_count()
+        if self.follow:
+            self.top = self._last_top(count)
+        return (self.top, count) != self.drawn
+
+    def _text(self, i: int) -> str:
+        return self.spill.line(i).decode("utf-8", "replace").replace("\t", TAB).replace("\0", "").rstrip("\r")
+
+    def draw(self, surf: pygame.Surface) -> None:
+        pygame.draw.rect(surf, self.background, self.rect)
+        pygame.draw.rect(surf, self.border, self.rect, width=1)
+        count = self.line_count()
+        self.drawn = (self.top, count)
+        if not count:
+            return
+        clip = surf.get_clip()
+        surf.set_clip(self.rect.inflate(-4, -4).clip(clip))
+        x, y = self.rect.x + 4, self.rect.y + 4
+        render = self.lines.render
+        blits = []
+        for i in range(self.top, min(count, self.top + self.rows)):
+            text = self._text(i)
+            if text:
+                blits.append((render(self.font, text, self.color), (x, y)))
+            y += self.line_height
+        surf.blits(blits, doreturn=False)
+        surf.set_clip(clip)
+        if count > self.rows:
+            bar = self.scrollbar_rect()
+            thumb_h = max(12, bar.h * self.rows // count)
+            thumb_y = bar.y + (bar.h - thumb_h) * self.top // max(1, self._last_top(count))
+            pygame.draw.rect(surf, self.border, (bar.x, thumb_y, bar.w, thumb_h))
@@ -0,0 +1,72 @@
+"""
+Flattens a model.py Command chain into a list of ops plus its shell string.
+
+Compilation walks output_destination with a loop, never by recursion, and
+the result is cached on the head of the chain. Stages count their own
+edits; when the chain is compiled again only the stages from the first
+edited (or re-linked) one onwards are redone, and when nothing at all
+was edited since the last compile the cached result is returned as is.
+"""
+from typing import List, NamedTuple, Optional
+
+
+class Op(NamedTuple):
+    """One stage of a compiled chain: its kind ("echo", "cat", ...) and argument."""
+    kind: str
+    arg: str
+
+
+class CompiledChain:
+    """Intermediate representation of a chain, parallel per-stage lists."""
+
+    def __init__(self):
+        self.stages: list = []
+        self.revs: List[int] = []
+        self.ops: List[Op] = []
+        self.tokens: List[str] = []  # each stage's piece of the shell string
+        self.end = -1  # index of the stage that ends the shell string
+        self.edits = -1  # global edit counter this result was built at
+        self.command = ""
+
+
+def compile_chain(head) -> CompiledChain:
+    """Compile the chain starting at head, reusing the cached result where it is valid."""
+    edits = type(head).edits
+    cached: Optional[CompiledChain] = head.__dict__.get("_compiled")
+    if cached is not None and cached.edits == edits:
+        return cached
+
+    result = CompiledChain()
+    stage = head
+    keep = 0
+    if cached is not None:
+        # Keep the unchanged prefix: same stage objects, no edits since last time
+        n = len(cached.stages)
+        while stage is not None and keep < n and cached.stages[keep] is stage and cached.revs[keep] == stage._rev:
+            stage = getattr(stage, "output_destination", None)
+            keep += 1
+        result.stages = cached.stages[:keep]
+        result.revs = cached.revs[:keep]
+        result.ops = cached.ops[:keep]
+        result.tokens = cached.tokens[:keep]
+        if 0 <= cached.end < keep:
+            result.end = cached.end
+            result.command = cached.command
+
+    # Recompile everything downstream of the first edit
+    while stage is not None:
+        token, ends = stage.command_token()
+        if ends and result.end < 0:
+            result.end = len(result.stages)
+        result.stages.append(stage)
+        result.revs.append(stage._rev)
+        result.ops.append(stage.op())
+        result.tokens.append(token)
+        stage = getattr(stage, "output_destination", None)
+
+    if cached is None or not (0 <= cached.end < keep):
+        stop = result.end + 1 if result.end >= 0 else len(result.tokens)
+        result.command = "".join(result.tokens[:stop])
+    result.edits = edits
+    object.__setattr__(head, "_compiled", result)
+    return result
@@ -0,0 +1,247 @@
+"""
+Runs a model.py chain as real processes joined by OS pipes.
+
+Each echo/cat stage becomes a subprocess. By default each stage's stdout
+is handed straight to the next stage's stdin as a kernel pipe, with no
+Python code in between. With metered=True a pump thread sits at every
+junction instead and counts the bytes each stage produces. The pumps use
+os.splice where available, so the data still moves only inside the
+kernel. Otherwise they fall back to large-buffer readinto(). The final
+output is streamed into the chain's StandardOut.
+"""
+import errno
+import os
+import subprocess
+import threading
+import time
+from typing import BinaryIO, List, Optional, Union
+
+from model import Command, StandardOut
+from pipeline_compiler import Op, compile_chain
+
+BUFFER_SIZE = 1024 * 1024
+HAS_SPLICE = hasattr(os, "splice")
+HAS_SENDFILE = hasattr(os, "sendfile")
+
+
+def stage_argv(op: Op) -> Optional[List[str]]:
+    """Command line for one op, or None when the op is not a process."""
+    if op.kind == "cat":
+        return ["cat", op.arg] if op.arg else ["cat"]
+    if op.kind == "echo":
+        # Without text the model's Echo forwards its input, which is what a bare cat does
+        return ["echo", op.arg] if op.arg else ["cat"]
+    return None
+
+
+class StageStats:
+    """Bytes a stage wrote and how long it took to write them."""
+
+    def __init__(self, argv: List[str]):
+        self.argv = argv
+        self.bytes: Optional[int] = None  # None when the stage was not metered
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        self.returncode: Optional[int] = None
+
+    @property
+    def bytes_per_sec(self) -> Optional[float]:
+        if self.bytes is None or self.seconds <= 0:
+            return None
+        return self.bytes / self.seconds
+
+    def __repr__(self) -> str:
+        rate = self.bytes_per_sec
+        shown = f"{rate / 1e6:.1f} MB/s" if rate is not None else "unmetered"
+        return f"<{' '.join(self.argv)}: {self.bytes} bytes, {shown}>"
+
+
+class PipelineResult:
+    def __init__(self, stages: List[StageStats], bytes_out: int, seconds: float, cancelled: bool):
+        self.stages = stages
+        self.bytes_out = bytes_out
+        self.seconds = seconds
+        self.cancelled = cancelled
+
+    @property
+    def ok(self) -> bool:
+        return not self.cancelled and all(s.returncode == 0 for s in self.stages)
+
+    @property
+    def bytes_per_sec(self) -> float:
+        return self.bytes_out / self.seconds if self.seconds > 0 else 0.0
+
+
+def _write_all(fd: int, data: memoryview) -> None:
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _copy(src: int, dst: int, buffer_size: int, stats: Optional[StageStats] = None) -> int:
+    """
+    Move bytes src -> dst until EOF with splice (in kernel) or readinto;
+    returns bytes moved. The running count is also kept in stats.bytes, so
+    it survives a broken pipe.
+    """
+    total = 0
+    if HAS_SPLICE:
+        try:
+            while True:
+                n = os.splice(src, dst, buffer_size)
+                if n == 0:
+                    return total
+                total += n
+                if stats is not None:
+                    stats.bytes = total
+        except OSError as e:
+            # This pair of fds cannot be spliced, copy instead
+            if e.errno != errno.EINVAL:
+                raise
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    while True:
+        n = os.readv(src, [buf])
+        if n == 0:
+            return total
+        _write_all(dst, view[:n])
+        total += n
+        if stats is not None:
+            stats.bytes = total
+
+
+def _pump(src: BinaryIO, dst: BinaryIO, stats: StageStats, buffer_size: int) -> None:
+    stats.bytes = 0
+    try:
+        _copy(src.fileno(), dst.fileno(), buffer_size, stats)
+    except BrokenPipeError:
+        pass  # the next stage stopped reading; stats.bytes has what got through
+    finally:
+        stats.seconds = time.perf_counter() - stats.start
+        src.close()
+        dst.close()
+
+
+def _feed_input(data: Union[bytes, BinaryIO], dst: BinaryIO, buffer_size: int) -> None:
+    """Write the pipeline's input: sendfile for real files, plain writes for bytes."""
+    try:
+        fd = dst.fileno()
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            _write_all(fd, memoryview(data))
+            return
+        src = data.fileno()
+        if HAS_SENDFILE:
+            offset = 0
+            try:
+                while True:
+                    n = os.sendfile(fd, src, offset, buffer_size)
+                    if n == 0:
+                        return
+                    offset += n
+            except BrokenPipeError:
+                raise
+            except OSError:
+                # Not something sendfile reads from (a pipe, a socket, ...): copy the rest instead
+                if offset:
+                    os.lseek(src, offset, os.SEEK_SET)
+        _copy(src, fd, buffer_size)
+    except BrokenPipeError:
+        pass
+    finally:
+        dst.close()
+
+
+def _kill_on_cancel(procs: List[subprocess.Popen], cancel: threading.Event, done: threading.Event) -> None:
+    while not done.wait(0.05):
+        if cancel.is_set():
+            for p in procs:
+                p.kill()
+            return
+
+
+def run_pipeline(head: Command, input: Union[bytes, BinaryIO, None] = None, metered: bool = False,
+                 buffer_size: int = BUFFER_SIZE, cancel: Optional[threading.Event] = None,
+                 sink: Optional[BinaryIO] = None) -> PipelineResult:
+    """
+    Run the chain starting at head as subprocesses and stream the output
+    into its StandardOut, or into sink if one is given (the chain is then
+    left untouched, so several runs of it can overlap). Setting cancel
+    kills the processes early.
+    """
+    compiled = compile_chain(head)
+    out = compiled.stages[-1] if isinstance(compiled.stages[-1], StandardOut) else None
+    writer = sink if sink is not None else out
+    argvs = [argv for argv in map(stage_argv, compiled.ops) if argv is not None]
+    started = time.perf_counter()
+
+    if not argvs:
+        # Nothing to run: the input goes straight to the output
+        data = input if isinstance(input, (bytes, bytearray)) else (input.read() if input else b"")
+        if writer is not None and data:
+            writer.write(bytes(data))
+        return PipelineResult([], len(data), time.perf_counter() - started, False)
+
+    stats = [StageStats(argv) for argv in argvs]
+    procs: List[subprocess.Popen] = []
+    threads: List[threading.Thread] = []
+    stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL
+    for i, argv in enumerate(argvs):
+        p = subprocess.Popen(argv, stdin=stdin, stdout=subprocess.PIPE)
+        stats[i].start = time.perf_counter()
+        if i == 0 and input is not None:
+            threads.append(threading.Thread(target=_feed_input, args=(input, p.stdin, buffer_size), daemon=True))
+        if procs and metered:
+            prev = procs[-1]
+            threads.append(threading.Thread(target=_pump, args=(prev.stdout, p.stdin, stats[i - 1], buffer_size),
+                                            daemon=True))
+        elif procs:
+            # The child now holds the read end; drop ours so EOF propagates
+            procs[-1].stdout.close()
+        procs.append(p)
+        stdin = subprocess.PIPE if metered else p.stdout
+    for t in threads:
+        t.start()
+
+    done = threading.Event()
+    if cancel is not None:
+        threading.Thread(target=_kill_on_cancel, args=(procs, cancel, done), daemon=True).start()
+
+    last = stats[-1]
+    src = procs[-1].stdout
+    file = getattr(out, "sink", None) if out is not None and sink is None else None
+    total = 0
+    try:
+        file_fd = file.fileno() if file is not None and hasattr(file, "fileno") else None
+    except (OSError, ValueError):
+        file_fd = None
+    try:
+        if file_fd is not None:
+            # Output goes to a real file: keep it in the kernel too
+            file.flush()
+            total = _copy(src.fileno(), file_fd, buffer_size)
+            out.bytes_written += total
+        else:
+            buf = bytearray(buffer_size)
+            view = memoryview(buf)
+            while True:
+                n = src.readinto(buf)
+                if not n:
+                    break
+                total += n
+                if writer is not None:
+                    writer.write(bytes(view[:n]))
+    finally:
+        done.set()
+        src.close()
+        last.bytes = total
+        last.seconds = time.perf_counter() - last.start
+        cancelled = cancel is not None and cancel.is_set()
+        if cancelled:
+            for p in procs:
+                p.kill()
+        for t in threads:
+            t.join()
+        for p, s in zip(procs, stats):
+            s.returncode = p.wait()
+            if not metered and s is not last:
+                s.seconds = last.seconds
+    return PipelineResult(stats, total, time.perf_counter() - started, cancelled)
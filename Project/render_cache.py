@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+import pygame
+
+TextKey = Tuple[pygame.font.Font, str, Tuple[int, int, int, int], bool]
+
+
+class TextCache:
+    """
+    Bounded LRU cache of rendered text surfaces.
+
+    Keys are (font, text, color, antialias), so each unique label is
+    rendered once and then only blitted. Call invalidate() whenever a font
+    object is replaced, e.g. after the window size changes FONT.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[TextKey, pygame.Surface]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def render(self, font: pygame.font.Font, text: str, color, antialias: bool = True) -> pygame.Surface:
+        rgba = tuple(pygame.Color(color)) if isinstance(color, str) else tuple(color)
+        key = (font, text, rgba, antialias)
+        surf = self.entries.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.entries[key] = surf
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surf
+
+    def invalidate(self, font: Optional[pygame.font.Font] = None) -> None:
+        """Drop everything, or only the surfaces rendered with font."""
+        if font is None:
+            self.entries.clear()
+            return
+        for key in [k for k in self.entries if k[0] is font]:
+            del self.entries[key]
+
+
+class SpriteCache:
+    """
+    Bounded LRU cache of fully composed block images.
+
+    A block (fill, border and label) is drawn once into its own surface
+    and afterwards drawn with a single blit. Entries depend on the font,
+    so clear it together with the text cache when the font changes.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, pygame.Surface]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Optional[pygame.Surface]:
+        surf = self.entries.get(key)
+        if surf is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return surf
+
+    def put(self, key: Hashable, surf: pygame.Surface) -> pygame.Surface:
+        self.entries[key] = surf
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surf
+
+    def invalidate(self) -> None:
+        self.entries.clear()
@@ -0,0 +1,148 @@
+"""
+Caches pipeline results by what they were computed from.
+
+A key combines the ops that shape a chain's output (see
+batch_executor.effective_ops), the identity of every file those ops read
+(path, size, mtime and, if asked for, a content hash) and a digest of the
+input bytes. Editing a block or touching one of its files therefore gives a
+new key, and running an unchanged chain again is a lookup. Results stay in
+memory under an LRU byte budget; with a directory set, entries pushed out
+of memory are spilled there and read back on a later miss.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from batch_executor import effective_ops
+from model import Command, StandardOut, run_ops
+from pipeline_compiler import compile_chain
+
+FileIdentity = Tuple[str, Optional[int], Optional[int], Optional[str]]
+HASH_BLOCK = 1024 * 1024
+
+
+def file_identity(path: str, hash_content: bool = False) -> FileIdentity:
+    """(path, size, mtime_ns, sha256) of a file; size and mtime are None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None, None)
+    digest = None
+    if hash_content:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                h.update(block)
+        digest = h.hexdigest()
+    return (path, st.st_size, st.st_mtime_ns, digest)
+
+
+def result_key(head: Command, input: bytes = b"", hash_content: bool = False) -> str:
+    """Hex digest naming the output of the chain at head for this input and these files."""
+    ops = effective_ops(compile_chain(head).ops)
+    files = tuple(file_identity(op.arg, hash_content) for op in ops if op.kind == "cat" and op.arg)
+    h = hashlib.sha256(repr((ops, files)).encode())
+    h.update(hashlib.sha256(input).digest())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache of pipeline outputs bounded by total bytes and entry count.
+
+    hits counts lookups served from memory or disk (disk_hits is the disk
+    share); misses counts lookups that had to run the pipeline.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 256,
+                 directory: Optional[str] = None, hash_content: bool = False):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.directory = directory
+        self.hash_content = hash_content
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.entries.get(key)
+        if data is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return data
+        if self.directory is not None:
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self.hits += 1
+                self.disk_hits += 1
+                self.put(key, data)
+                return data
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> bytes:
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        if len(data) > self.max_bytes:
+            # Too big to keep in memory at all
+            self._spill(key, data)
+            return data
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self._spill(evicted_key, evicted)
+        return data
+
+    def _spill(self, key: str, data: bytes) -> None:
+        if self.directory is None:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def invalidate(self) -> None:
+        """Drop the in-memory entries (spilled files are kept)."""
+        self.entries.clear()
+        self.size = 0
+
+    def run(self, head: Command, input: bytes = b"") -> bytes:
+        """
+        Output of the chain at head, from the cache when possible. Like
+        run_batch, the result is also written into the chain's StandardOut.
+        """
+        key = result_key(head, input, self.hash_content)
+        data = self.get(key)
+        if data is None:
+            data = self.put(key, run_ops(effective_ops(compile_chain(head).ops), input))
+        out = compile_chain(head).stages[-1]
+        if isinstance(out, StandardOut):
+            out.write(data)
+            out.value = data
+        return data
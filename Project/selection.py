@@ -0,0 +1,146 @@
+"""
+Rubber-band selection and group drag.
+
+The band is a screen rectangle; releasing it selects every block the
+canvas index returns for the world area under it, so no block is
+scanned that is not near the band. While a group is dragged its blocks
+are off the canvas and drawn as one pre-rendered sprite (self.sprite,
+built by the editor) at the drag offset. Each frame then costs one
+offset update, one clamp of the group's bounding box and one blit,
+however many blocks are selected. A snap applied on top of the drag is
+clamped to the same area. Dropping applies the offset to all
+blocks with a single bulk canvas call.
+"""
+from typing import List, Optional, Sequence, Set, Tuple
+
+import pygame
+
+Bounds = Tuple[int, int, int, int]
+
+
+def union_bounds(blocks: Sequence) -> Optional[Bounds]:
+    if not blocks:
+        return None
+    rect = pygame.Rect(blocks[0].get_bounds()).unionall([pygame.Rect(b.get_bounds()) for b in blocks[1:]])
+    return (rect.x, rect.y, rect.w, rect.h)
+
+
+class Selection:
+    def __init__(self, color, band_color):
+        self.color = color
+        self.band_color = band_color
+        self._blocks: List = []
+        self._members: Set = set()  # the same blocks, for membership tests on every click
+        self.band_start: Optional[Tuple[int, int]] = None
+        self.band_end: Optional[Tuple[int, int]] = None
+        # Group drag state (world coordinates)
+        self.dragging = False
+        self.bounds: Optional[Bounds] = None  # group bounding box where the drag started
+        self.anchor = (0.0, 0.0)
+        self.offset = (0.0, 0.0)
+        self.area: Optional[Bounds] = None  # where the group's box has to stay while dragged
+        self.sprite: Optional[pygame.Surface] = None
+
+    @property
+    def blocks(self) -> List:
+        return self._blocks
+
+    @blocks.setter
+    def blocks(self, blocks: List) -> None:
+        self._blocks = blocks
+        self._members = set(blocks)
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __contains__(self, block: object) -> bool:
+        return block in self._members
+
+    def clear(self) -> List[Bounds]:
+        """Deselect everything; returns the world bounds that need a redraw."""
+        dirty = [b.get_bounds() for b in self.blocks]
+        self.blocks = []
+        return dirty
+
+    # Rubber band (screen coordinates)
+
+    def band_rect(self) -> Optional[pygame.Rect]:
+        if self.band_start is None:
+            return None
+        (x0, y0), (x1, y1) = self.band_start, self.band_end
+        return pygame.Rect(min(x0, x1), min(y0, y1), abs(x1 - x0) + 1, abs(y1 - y0) + 1)
+
+    def start_band(self, sx: int, sy: int) -> None:
+        self.band_start = self.band_end = (sx, sy)
+
+    def update_band(self, sx: int, sy: int) -> List[pygame.Rect]:
+        """Stretch the band to the mouse; returns the screen areas to redraw."""
+        old = self.band_rect()
+        self.band_end = (sx, sy)
+        return [old, self.band_rect()]
+
+    def finish_band(self, canvas, view) -> List[pygame.Rect]:
+        """Select the blocks under the band with one index query."""
+        band = self.band_rect()
+        self.band_start = self.band_end = None
+        self.blocks = canvas.index.query_rect(view.world_bounds(band))
+        return [band]
+
+    # Group drag (world coordinates)
+
+    def start_drag(self, canvas, wx: float, wy: float) -> None:
+        """Lift the selected blocks off the canvas; the mouse is at world (wx, wy)."""
+        self.dragging = True
+        self.bounds = union_bounds(self.blocks)
+        self.anchor = (wx, wy)
+        self.offset = (0.0, 0.0)
+        self.area = None
+        canvas.remove_commands(self.blocks)
+
+    def drag_bounds(self) -> Bounds:
+        """Where the group's bounding box is now."""
+        x, y, w, h = self.bounds
+        return (int(x + self.offset[0]), int(y + self.offset[1]), w, h)
+
+    def _clamped(self, dx: float, dy: float) -> Tuple[int, int]:
+        """The offset closest to (dx, dy) that keeps the group's box inside self.area."""
+        if self.area is not None:
+            # Clamp the whole group at once by clamping its bounding box
+            x, y, w, h = self.bounds
+            left, top, width, height = self.area
+            dx = max(left - x, min(dx, left + width - (x + w)))
+            dy = max(top - y, min(dy, top + height - (y + h)))
+        return (int(dx), int(dy))
+
+    def drag_to(self, wx: float, wy: float, area: Optional[Bounds] = None) -> List[Bounds]:
+        """Move the group with the mouse, keeping its box inside area; returns old and new bounds."""
+        old = self.drag_bounds()
+        self.area = area
+        self.offset = self._clamped(wx - self.anchor[0], wy - self.anchor[1])
+        return [old, self.drag_bounds()]
+
+    def shift(self, dx: int, dy: int) -> Bounds:
+        """Move the dragged group a little further (e.g. to snap it), clamped like drag_to(); returns its new bounds."""
+        self.offset = self._clamped(self.offset[0] + dx, self.offset[1] + dy)
+        return self.drag_bounds()
+
+    def drop(self, canvas) -> Tuple[float, float]:
+        """Put the group back on the canvas at the drag offset; returns the offset."""
+        dx, dy = self._clamped(*self.offset)
+        canvas.translate_commands(self.blocks, dx, dy)
+        self.blocks = canvas.append_commands(self.blocks)
+        self.dragging = False
+        self.sprite = None
+        return dx, dy
+
+    def draw(self, surf: pygame.Surface, view) -> None:
+        if self.dragging:
+            if self.sprite is not None:
+                x, y, _, _ = self.drag_bounds()
+                surf.blit(self.sprite, view.to_screen(x, y))
+        else:
+            for block in self.blocks:
+                pygame.draw.rect(surf, self.color, view.screen_rect(block.get_bounds()), width=2)
+        band = self.band_rect()
+        if band is not None:
+            pygame.draw.rect(surf, self.band_color, band, width=1)
@@ -0,0 +1,165 @@
+"""
+Snapping for dragged blocks: to the edges and centres of other blocks,
+else to a grid.
+
+EdgeIndex keeps every placed block's left, centre and right x (and top,
+middle and bottom y) in two sorted lists. Each entry is one int, the
+edge in half pixels shifted left with the block's key in the low bits,
+so the lists sort and bisect as plain ints. For each edge of the dragged
+block, one bisect finds the nearest edge of any other block, so a snap
+costs O(log n) however crowded the canvas is. Adding or moving one block
+is a bisect plus a list insert. Bulk changes (loading a workspace,
+dropping a large group) re-sort instead. snap() also returns the
+alignment guides to draw: a line through each matched edge that spans
+both blocks.
+"""
+from bisect import bisect_left, insort
+from itertools import count
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+Bounds = Tuple[int, int, int, int]
+Entry = int  # (edge in half pixels << KEY_BITS) | block key
+Guide = Tuple[Tuple[float, float], Tuple[float, float]]  # world line segment
+
+KEY_BITS = 32
+KEY_MASK = (1 << KEY_BITS) - 1
+BULK_UPDATE = 64  # update_many()/remove_many() re-sort for groups larger than this
+
+
+class Snap(NamedTuple):
+    dx: int
+    dy: int
+    guides: List[Guide]
+
+
+def edges_of(bounds: Bounds) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+    x, y, w, h = bounds
+    return (x, x + w / 2, x + w), (y, y + h / 2, y + h)
+
+
+def _entry(edge: float, key: int) -> Entry:
+    # Block bounds are whole pixels, so every edge and centre is a whole number of half pixels
+    return round(edge * 2) << KEY_BITS | key
+
+
+def _nearest(entries: List[Entry], values: Sequence[float], distance: float) -> Optional[Tuple[float, float, int]]:
+    """(delta, matched coordinate, key) of the entry closest to any of values, within distance."""
+    best = None
+    for value in values:
+        i = bisect_left(entries, _entry(value, 0))
+        for j in (i - 1, i):
+            if 0 <= j < len(entries):
+                entry = entries[j]
+                edge, key = (entry >> KEY_BITS) / 2, entry & KEY_MASK
+                delta = edge - value
+                if abs(delta) <= distance and (best is None or abs(delta) < abs(best[0])):
+                    best = (delta, edge, key)
+    return best
+
+
+class EdgeIndex:
+    def __init__(self):
+        self.xs: List[Entry] = []
+        self.ys: List[Entry] = []
+        self.keys: Dict[object, int] = {}
+        self.edges: Dict[int, Tuple[Tuple[float, ...], Tuple[float, ...]]] = {}
+        self.ids = count()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, block: object) -> bool:
+        return block in self.keys
+
+    def rebuild(self, blocks: Iterable) -> None:
+        """Index exactly these blocks, sorting once."""
+        self.keys.clear()
+        self.edges.clear()
+        xs: List[Entry] = []
+        ys: List[Entry] = []
+        for block in blocks:
+            key = next(self.ids)
+            self.keys[block] = key
+            ex, ey = self.edges[key] = edges_of(block.get_bounds())
+            xs.extend([_entry(e, key) for e in ex])
+            ys.extend([_entry(e, key) for e in ey])
+        xs.sort()
+        ys.sort()
+        self.xs, self.ys = xs, ys
+
+    def _drop(self, key: int) -> None:
+        ex, ey = self.edges.pop(key)
+        for entries, values in ((self.xs, ex), (self.ys, ey)):
+            for e in values:
+                del entries[bisect_left(entries, _entry(e, key))]
+
+    def update(self, block) -> None:
+        """Add block, or re-index it after it moved."""
+        key = self.keys.get(block)
+        if key is None:
+            key = self.keys[block] = next(self.ids)
+        else:
+            self._drop(key)
+        ex, ey = self.edges[key] = edges_of(block.get_bounds())
+        for e in ex:
+            insort(self.xs, _entry(e, key))
+        for e in ey:
+            insort(self.ys, _entry(e, key))
+
+    def remove(self, block) -> None:
+        key = self.keys.pop(block, None)
+        if key is not None:
+            self._drop(key)
+
+    def update_many(self, blocks: Sequence, placed: Callable[[], Iterable]) -> None:
+        """update() for a group. placed() lists every block on the canvas, for when re-sorting is cheaper."""
+        if len(blocks) > BULK_UPDATE:
+            self.rebuild(placed())
+        else:
+            for block in blocks:
+                self.update(block)
+
+    def remove_many(self, blocks: Sequence, placed: Callable[[], Iterable]) -> None:
+        """remove() for a group, with placed() as in update_many()."""
+        if len(blocks) > BULK_UPDATE:
+            self.rebuild(placed())
+        else:
+            for block in blocks:
+                self.remove(block)
+
+    def snap(self, bounds: Bounds, distance: float, grid: int = 0) -> Snap:
+        """
+        How far to move a block at bounds so one of its edges or centres
+        meets another block's (within distance), per axis. An axis with no
+        match snaps the block's corner to the grid instead (grid=0: no grid).
+        """
+        ex, ey = edges_of(bounds)
+        match_x = _nearest(self.xs, ex, distance)
+        match_y = _nearest(self.ys, ey, distance)
+        x, y, w, h = bounds
+        if match_x is not None:
+            dx = round(match_x[0])
+        else:
+            dx = round(x / grid) * grid - x if grid else 0
+        if match_y is not None:
+            dy = round(match_y[0])
+        else:
+            dy = round(y / grid) * grid - y if grid else 0
+        guides: List[Guide] = []
+        x, y = x + dx, y + dy
+        if match_x is not None:
+            _, edge, key = match_x
+            _, (top, _, bottom) = self.edges[key]
+            guides.append(((edge, min(top, y)), (edge, max(bottom, y + h))))
+        if match_y is not None:
+            _, edge, key = match_y
+            (left, _, right), _ = self.edges[key]
+            guides.append(((min(left, x), edge), (max(right, x + w), edge)))
+        return Snap(int(dx), int(dy), guides)
+
+
+def guide_bounds(guide: Guide, pad: int = 1) -> Bounds:
+    """World bounds covering a guide line."""
+    (x0, y0), (x1, y1) = guide
+    left, top = int(min(x0, x1)) - pad, int(min(y0, y1)) - pad
+    return (left, top, int(abs(x1 - x0)) + 2 * pad + 1, int(abs(y1 - y0)) + 2 * pad + 1)
@@ -0,0 +1,132 @@
+import math
+from bisect import bisect_left
+from typing import Dict, Generic, Iterable, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+Bounds = Tuple[int, int, int, int]
+Cell = Tuple[int, int]
+
+
+class SpatialGrid(Generic[T]):
+    """
+    Uniform grid index over axis-aligned block bounds.
+
+    Every item is stored in each cell its bounds overlap, together with a
+    z value. Items inserted later get a higher z, so they are "on top" the
+    same way a later entry in a draw list is. Each cell keeps its items
+    sorted by z, so a point lookup can stop at the first (topmost) hit.
+    """
+
+    def __init__(self, cell_size: int = 128):
+        self.cell_size = cell_size
+        # cell -> (z values ascending, items in the same order)
+        self.cells: Dict[Cell, Tuple[List[int], List[T]]] = {}
+        self.entries: Dict[T, Tuple[int, Bounds, List[Cell]]] = {}
+        self.next_z = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, item: T) -> bool:
+        return item in self.entries
+
+    def _cells_for(self, x: int, y: int, w: int, h: int) -> List[Cell]:
+        size = self.cell_size
+        x0, y0 = x // size, y // size
+        x1, y1 = (x + max(w, 1) - 1) // size, (y + max(h, 1) - 1) // size
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def insert(self, item: T, bounds: Bounds, z: Optional[int] = None) -> None:
+        """Add item on top of everything else (or at the given z)."""
+        if item in self.entries:
+            self.remove(item)
+        if z is None:
+            z = self.next_z
+        self.next_z = max(self.next_z, z + 1)
+        cells = self._cells_for(*bounds)
+        for cell in cells:
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                self.cells[cell] = ([z], [item])
+            elif z > bucket[0][-1]:
+                bucket[0].append(z)
+                bucket[1].append(item)
+            else:
+                i = bisect_left(bucket[0], z)
+                bucket[0].insert(i, z)
+                bucket[1].insert(i, item)
+        self.entries[item] = (z, bounds, cells)
+
+    def remove(self, item: T) -> None:
+        entry = self.entries.pop(item, None)
+        if entry is None:
+            return
+        z = entry[0]
+        for cell in entry[2]:
+            zs, items = self.cells[cell]
+            if len(zs) == 1:
+                del self.cells[cell]
+                continue
+            i = bisect_left(zs, z)
+            del zs[i]
+            del items[i]
+
+    def update(self, item: T, bounds: Bounds) -> None:
+        """Move item to new bounds, keeping its z."""
+        entry = self.entries.get(item)
+        if entry is None:
+            self.insert(item, bounds)
+            return
+        z, _, old_cells = entry
+        new_cells = self._cells_for(*bounds)
+        if new_cells != old_cells:
+            self.remove(item)
+            self.insert(item, bounds, z)
+        else:
+            self.entries[item] = (z, bounds, old_cells)
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.entries.clear()
+        self.next_z = 0
+
+    def bounds_of(self, item: T) -> Optional[Bounds]:
+        entry = self.entries.get(item)
+        return entry[1] if entry is not None else None
+
+    def query_point(self, px: int, py: int) -> Optional[T]:
+        """Return the topmost item containing the point, or None."""
+        size = self.cell_size
+        bucket = self.cells.get((math.floor(px) // size, math.floor(py) // size))
+        if bucket is None:
+            return None
+        entries = self.entries
+        for item in reversed(bucket[1]):
+            x, y, w, h = entries[item][1]
+            if x <= px < x + w and y <= py < y + h:
+                return item
+        return None
+
+    def query_rect(self, bounds: Bounds) -> List[T]:
+        """Return every item overlapping bounds, bottom to top."""
+        qx, qy, qw, qh = bounds
+        found: Set[T] = set()
+        for cell in self._cells_for(qx, qy, qw, qh):
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                found.update(bucket[1])
+        entries = self.entries
+        hits = []
+        for item in found:
+            z, (x, y, w, h), _ = entries[item]
+            if x < qx + qw and qx < x + w and y < qy + qh and qy < y + h:
+                hits.append((z, item))
+        hits.sort(key=lambda pair: pair[0])
+        return [item for _, item in hits]
+
+    def rebuild(self, items: Iterable[Tuple[T, Bounds]]) -> None:
+        """Reindex from scratch; items are given bottom to top."""
+        self.clear()
+        for item, bounds in items:
+            self.insert(item, bounds)
@@ -0,0 +1,89 @@
+"""The incremental linker against a from-scratch rebuild()."""
+import random
+from collections import Counter
+
+from canvas_compiler import LINK_GAP, CanvasCompiler
+from spatial_index import SpatialGrid
+
+
+class Block:
+    def __init__(self, label, x, y, w=80, h=30):
+        self.label, self.x, self.y, self.w, self.h = label, x, y, w, h
+
+    def get_bounds(self):
+        return (self.x, self.y, self.w, self.h)
+
+
+class Canvas:
+    def __init__(self):
+        self.commands = []
+        self.index = SpatialGrid()
+
+    def append_command(self, block):
+        self.commands.append(block)
+        self.index.insert(block, block.get_bounds())
+        return block
+
+    def remove_command(self, block):
+        self.index.remove(block)
+        self.commands.remove(block)
+
+    def move_command(self, block, x, y):
+        block.x, block.y = x, y
+        self.index.update(block, block.get_bounds())
+
+    def get_commands(self):
+        return self.commands
+
+
+def links(compiler):
+    """The links as pairs of bounds, so blocks stacked on the same spot compare equal."""
+    return Counter((upper.get_bounds(), lower.get_bounds()) for upper, lower in compiler.next.items())
+
+
+def rebuilt(canvas):
+    compiler = CanvasCompiler(canvas)
+    compiler.rebuild()
+    return links(compiler)
+
+
+def test_links_do_not_depend_on_drop_order():
+    for order in ((0, 1), (1, 0)):
+        canvas = Canvas()
+        compiler = CanvasCompiler(canvas)
+        blocks = [Block("Echo", 20, 59), Block("Cat", 30, 59 + 30 + LINK_GAP)]
+        for i in order:
+            compiler.update(canvas.append_command(blocks[i]))
+        assert compiler.next.get(blocks[0]) is blocks[1]
+
+
+def test_incremental_links_match_rebuild():
+    rng = random.Random(1234)
+    for _ in range(200):
+        canvas = Canvas()
+        compiler = CanvasCompiler(canvas)
+        for _ in range(40):
+            blocks = canvas.get_commands()
+            action = rng.random()
+            # A small area with a coarse grid, so blocks often compete for the same neighbour
+            x, y = rng.randrange(0, 200, 4), rng.randrange(0, 200, 4)
+            if action < 0.5 or not blocks:
+                block = Block(rng.choice(("Echo", "Cat")), x, y, rng.choice((60, 80)))
+                compiler.update(canvas.append_command(block))
+            elif action < 0.65:
+                # Moved in place (undo, redo)
+                block = rng.choice(blocks)
+                canvas.move_command(block, x, y)
+                compiler.update(block)
+            elif action < 0.85:
+                # A drag: picked up (off the canvas), then dropped somewhere else
+                block = rng.choice(blocks)
+                canvas.remove_command(block)
+                compiler.remove(block)
+                block.x, block.y = x, y
+                compiler.update(canvas.append_command(block))
+            else:
+                block = rng.choice(blocks)
+                canvas.remove_command(block)
+                compiler.remove(block)
+            assert links(compiler) == rebuilt(canvas)
@@ -0,0 +1,65 @@
+"""Round trips through a workspace file and its journal."""
+from workspace_file import Journal, WorkspaceFile, read_journal, replay, write_workspace
+
+
+class Block:
+    def __init__(self, label, x, y, w=80, h=30):
+        self.label, self.x, self.y, self.w, self.h = label, x, y, w, h
+
+
+def load(path):
+    """What open_workspace() does, minus the canvas: the live blocks and the journal."""
+    with WorkspaceFile(path) as ws:
+        blocks = [Block(label, x, y, w, h) for label, x, y, w, h in ws.rows(ws.blocks)]
+        generation = ws.generation
+    records = read_journal(path, generation)
+    replay(records, blocks, add=lambda r: Block(r.label, r.x, r.y, r.w, r.h),
+           move=lambda block, r: (setattr(block, "x", r.x), setattr(block, "y", r.y)),
+           remove=lambda block: None)
+    journal = Journal(path, generation, len(records))
+    journal.bind(blocks)
+    return [b for b in blocks if b is not None], journal
+
+
+def state(blocks):
+    return sorted((b.label, b.x, b.y) for b in blocks)
+
+
+def test_add_after_removals_gets_a_fresh_id(tmp_path):
+    path = str(tmp_path / "canvas.blkw")
+    write_workspace(path, [(f"b{i}", 10.0 * i, 0.0, 80, 30) for i in range(4)], [])
+
+    blocks, journal = load(path)
+    for block in blocks[:2]:
+        journal.removed(block)
+    journal.close()
+
+    blocks, journal = load(path)
+    assert state(blocks) == [("b2", 20.0, 0.0), ("b3", 30.0, 0.0)]
+    new = Block("new", 5.0, 5.0)
+    journal.added(new)
+    journal.moved(blocks[0])
+    journal.close()
+
+    blocks, journal = load(path)
+    journal.close()
+    assert state(blocks) == [("b2", 20.0, 0.0), ("b3", 30.0, 0.0), ("new", 5.0, 5.0)]
+
+
+def test_stale_journal_is_started_over(tmp_path):
+    path = str(tmp_path / "canvas.blkw")
+    old = write_workspace(path, [("a", 0.0, 0.0, 80, 30)], [])
+    journal = Journal(path, old)
+    journal.added(Block("gone", 1.0, 1.0))
+    journal.close()
+    # Crash after the new snapshot replaced the file but before the journal was reset
+    write_workspace(path, [("a", 0.0, 0.0, 80, 30)], [])
+
+    blocks, journal = load(path)
+    assert state(blocks) == [("a", 0.0, 0.0)]
+    journal.added(Block("kept", 2.0, 2.0))
+    journal.close()
+
+    blocks, journal = load(path)
+    journal.close()
+    assert state(blocks) == [("a", 0.0, 0.0), ("kept", 2.0, 2.0)]
@@ -0,0 +1,75 @@
+"""
+Pan and zoom for the canvas panel.
+
+Blocks live in world coordinates; the viewport maps them onto the canvas
+panel of the window. Zoom moves in fixed steps (ZOOM_STEP ** level), so
+the scaled block images can be cached per level and reused while the
+view is panned. visible_bounds() gives the world area on screen, which
+the editor passes to the spatial index to draw only what can be seen.
+"""
+import math
+from typing import Tuple
+
+import pygame
+
+Bounds = Tuple[int, int, int, int]
+
+ZOOM_STEP = 1.25
+MIN_ZOOM_LEVEL = -8
+MAX_ZOOM_LEVEL = 6
+
+
+class Viewport:
+    def __init__(self, panel: pygame.Rect, x: float = 0.0, y: float = 0.0, level: int = 0):
+        self.panel = pygame.Rect(panel)
+        self.x = x  # world position shown at the panel's top-left corner
+        self.y = y
+        self.level = level
+
+    @property
+    def zoom(self) -> float:
+        return ZOOM_STEP ** self.level
+
+    def to_world(self, sx: float, sy: float) -> Tuple[float, float]:
+        zoom = self.zoom
+        return (self.x + (sx - self.panel.x) / zoom, self.y + (sy - self.panel.y) / zoom)
+
+    def to_screen(self, wx: float, wy: float) -> Tuple[int, int]:
+        zoom = self.zoom
+        return (int((wx - self.x) * zoom) + self.panel.x, int((wy - self.y) * zoom) + self.panel.y)
+
+    def screen_rect(self, bounds: Bounds) -> pygame.Rect:
+        """Where world bounds appear on screen."""
+        x, y, w, h = bounds
+        sx, sy = self.to_screen(x, y)
+        zoom = self.zoom
+        return pygame.Rect(sx, sy, max(1, round(w * zoom)), max(1, round(h * zoom)))
+
+    def world_bounds(self, rect: pygame.Rect) -> Bounds:
+        """World area under a screen rectangle, rounded outwards."""
+        x0, y0 = self.to_world(rect.left, rect.top)
+        x1, y1 = self.to_world(rect.right, rect.bottom)
+        left, top = math.floor(x0), math.floor(y0)
+        return (left, top, math.ceil(x1) - left, math.ceil(y1) - top)
+
+    def visible_bounds(self) -> Bounds:
+        return self.world_bounds(self.panel)
+
+    def pan(self, dx: float, dy: float) -> None:
+        """Scroll the view by a distance in screen pixels."""
+        zoom = self.zoom
+        self.x -= dx / zoom
+        self.y -= dy / zoom
+
+    def zoom_at(self, steps: int, sx: float, sy: float) -> bool:
+        """Zoom in (steps > 0) or out around a screen point; False if already at the limit."""
+        level = min(MAX_ZOOM_LEVEL, max(MIN_ZOOM_LEVEL, self.level + steps))
+        if level == self.level:
+            return False
+        wx, wy = self.to_world(sx, sy)
+        self.level = level
+        zoom = self.zoom
+        # Keep the world point under the cursor where it was
+        self.x = wx - (sx - self.panel.x) / zoom
+        self.y = wy - (sy - self.panel.y) / zoom
+        return True
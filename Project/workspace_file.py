@@ -0,0 +1,337 @@
+"""
+Binary workspace files and their autosave journal.
+
+A workspace file stores the canvas blocks and the sandbox templates as
+columns: all x values, then all y values, w, h and a type index into a
+label table. Columns are 8-byte aligned, so a reader can mmap the file
+and use each column in place as a memoryview (or a NumPy array) without
+parsing per-block records. Templates are stored by type and order only
+(their geometry columns are zero), because their place in the sandbox
+depends on the window the editor runs in.
+
+Edits made after a save go to "<path>.journal" as fixed-size records
+(add, move, remove). A background thread appends them in batches, so
+autosave costs the UI one deque append per edit. When the journal grows
+past the size of the workspace, compact() writes a fresh snapshot and
+starts an empty journal. The journal header carries the snapshot's
+generation number, so a journal that belongs to an older snapshot is
+ignored on load instead of replayed twice.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+from typing import BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+MAGIC = b"BLKW"
+JOURNAL_MAGIC = b"BLKJ"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQIII")  # magic, version, reserved, generation, labels size, blocks, templates
+JOURNAL_HEADER = struct.Struct("<4sQ")  # magic, generation
+RECORD = struct.Struct("<cIdd16sii")  # op, block id, x, y, label, w, h
+AUTOSAVE_INTERVAL = 0.5  # seconds between journal flushes
+COMPACT_MIN_RECORDS = 1024
+
+ADD, MOVE, REMOVE = b"A", b"M", b"R"
+
+Row = Tuple[str, float, float, int, int]  # label, x, y, w, h
+
+
+class Columns(NamedTuple):
+    """One section of a workspace file as parallel columns."""
+    x: Sequence[float]
+    y: Sequence[float]
+    w: Sequence[int]
+    h: Sequence[int]
+    type: Sequence[int]  # index into WorkspaceFile.labels
+
+
+class JournalRecord(NamedTuple):
+    op: bytes
+    block_id: int
+    label: str
+    x: float
+    y: float
+    w: int
+    h: int
+
+
+def _pad(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _section_size(n: int) -> int:
+    return 8 * n + 8 * n + _pad(4 * n) + _pad(4 * n) + _pad(2 * n)
+
+
+def new_generation() -> int:
+    return time.time_ns()
+
+
+def write_workspace(path: str, blocks: Iterable[Row], templates: Iterable[Row],
+                    generation: Optional[int] = None) -> int:
+    """Write a workspace file atomically; returns its generation number."""
+    if generation is None:
+        generation = new_generation()
+    labels: Dict[str, int] = {}
+    sections = []
+    for rows in (blocks, templates):
+        xs, ys, ws, hs, ts = array("d"), array("d"), array("i"), array("i"), array("H")
+        for label, x, y, w, h in rows:
+            xs.append(x)
+            ys.append(y)
+            ws.append(w)
+            hs.append(h)
+            ts.append(labels.setdefault(label, len(labels)))
+        sections.append((xs, ys, ws, hs, ts))
+    label_bytes = b"\0".join(label.encode() for label in labels)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, generation, len(label_bytes),
+                            len(sections[0][0]), len(sections[1][0])))
+        f.write(label_bytes.ljust(_pad(len(label_bytes)), b"\0"))
+        for columns in sections:
+            for column in columns:
+                data = column.tobytes()
+                f.write(data.ljust(_pad(len(data)), b"\0"))
+    os.replace(tmp, path)
+    return generation
+
+
+class WorkspaceFile:
+    """
+    A workspace file opened with mmap. The columns are views into the
+    mapping, so close() only after the data has been copied out.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        magic, version, _, self.generation, labels_size, n_blocks, n_templates = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            view.release()
+            self.map.close()
+            raise ValueError(f"{path} is not a version {VERSION} workspace file")
+        offset = HEADER.size
+        raw = bytes(view[offset:offset + labels_size])
+        self.labels: List[str] = [label.decode() for label in raw.split(b"\0")] if raw else []
+        offset += _pad(labels_size)
+        self.blocks = self._columns(view, offset, n_blocks)
+        offset += _section_size(n_blocks)
+        self.templates = self._columns(view, offset, n_templates)
+        self.view = view
+
+    @staticmethod
+    def _columns(view: memoryview, offset: int, n: int) -> Columns:
+        out = []
+        for fmt, size in (("d", 8), ("d", 8), ("i", 4), ("i", 4), ("H", 2)):
+            out.append(view[offset:offset + size * n].cast(fmt))
+            offset += _pad(size * n)
+        return Columns(*out)
+
+    def rows(self, columns: Columns) -> Iterator[Row]:
+        labels = self.labels
+        for x, y, w, h, t in zip(*columns):
+            yield labels[t], x, y, w, h
+
+    def close(self) -> None:
+        for columns in (self.blocks, self.templates):
+            for column in columns:
+                column.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self) -> "WorkspaceFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def template_rows(templates: Iterable) -> List[Row]:
+    """Rows for the sandbox templates: type and order, no geometry."""
+    return [(t.label, 0.0, 0.0, 0, 0) for t in templates]
+
+
+def journal_path(path: str) -> str:
+    return path + ".journal"
+
+
+def read_journal(path: str, generation: int) -> List[JournalRecord]:
+    """Records journalled on top of the snapshot with this generation."""
+    try:
+        with open(journal_path(path), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    if len(data) < JOURNAL_HEADER.size:
+        return []
+    magic, journal_generation = JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC or journal_generation != generation:
+        return []
+    records = []
+    # A torn last record (crash mid-write) is dropped by stopping at a whole record
+    end = JOURNAL_HEADER.size + (len(data) - JOURNAL_HEADER.size) // RECORD.size * RECORD.size
+    for op, block_id, x, y, label, w, h in RECORD.iter_unpack(data[JOURNAL_HEADER.size:end]):
+        records.append(JournalRecord(op, block_id, label.rstrip(b"\0").decode(), x, y, w, h))
+    return records
+
+
+class Journal:
+    """
+    Append-only log of canvas edits on top of a workspace file.
+
+    Blocks are identified by their position in the last snapshot; blocks
+    added afterwards get the following ids, in the order they were added.
+    All file writes happen on a background thread.
+    """
+
+    def __init__(self, path: str, generation: int, records: int = 0):
+        self.path = path
+        self.generation = generation
+        self.records = records  # records written since the last snapshot
+        self.ids: Dict[object, int] = {}
+        self.next_id = 0
+        self.pending: Deque = deque()
+        self.wake = threading.Event()
+        self.closed = False
+        self.file = self._open()
+        self.thread = threading.Thread(target=self._writer, name="journal", daemon=True)
+        self.thread.start()
+
+    def _open(self) -> BinaryIO:
+        """
+        Open the journal for appending. A journal left over from another
+        snapshot (a crash between saving and resetting it) is started over,
+        and a torn last record is cut off so new records stay aligned.
+        """
+        path = journal_path(self.path)
+        f = open(path, "r+b" if os.path.exists(path) else "w+b")
+        header = f.read(JOURNAL_HEADER.size)
+        if len(header) == JOURNAL_HEADER.size and JOURNAL_HEADER.unpack(header) == (JOURNAL_MAGIC, self.generation):
+            size = f.seek(0, os.SEEK_END)
+            f.truncate(JOURNAL_HEADER.size + (size - JOURNAL_HEADER.size) // RECORD.size * RECORD.size)
+            f.seek(0, os.SEEK_END)
+        else:
+            f.seek(0)
+            f.truncate()
+            f.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, self.generation))
+            f.flush()
+        return f
+
+    def bind(self, blocks: Iterable[Optional[object]]) -> None:
+        """
+        Number blocks in snapshot order (after a load or a compaction).
+        A replayed list holds None for removed blocks; their ids stay used.
+        """
+        blocks = list(blocks)
+        self.ids = {block: i for i, block in enumerate(blocks) if block is not None}
+        self.next_id = len(blocks)
+
+    def id_of(self, block: object) -> int:
+        block_id = self.ids.get(block)
+        if block_id is None:
+            block_id = self.ids[block] = self.next_id
+            self.next_id += 1
+        return block_id
+
+    def _append(self, op: bytes, block_id: int, block) -> None:
+        self.pending.append(RECORD.pack(op, block_id, block.x, block.y, block.label.encode()[:16],
+                                        block.w, block.h))
+        self.records += 1
+
+    def added(self, block) -> None:
+        self._append(ADD, self.id_of(block), block)
+
+    def moved(self, block) -> None:
+        if block not in self.ids:
+            self.added(block)
+            return
+        self._append(MOVE, self.ids[block], block)
+
+    def removed(self, block) -> None:
+        block_id = self.ids.pop(block, None)
+        if block_id is not None:
+            self._append(REMOVE, block_id, block)
+
+    def needs_compaction(self) -> bool:
+        return self.records > max(COMPACT_MIN_RECORDS, len(self.ids))
+
+    def compact(self, blocks: Sequence, templates: Sequence) -> None:
+        """Write a new snapshot of blocks and templates and start an empty journal."""
+        blocks = list(blocks)
+        rows = [(b.label, b.x, b.y, b.w, b.h) for b in blocks]
+        saved_templates = template_rows(templates)
+        generation = new_generation()
+        self.bind(blocks)
+        self.records = 0
+        self.pending.append(lambda: self._rewrite(rows, saved_templates, generation))
+        self.wake.set()
+
+    def _rewrite(self, rows: List[Row], template_rows: List[Row], generation: int) -> None:
+        write_workspace(self.path, rows, template_rows, generation)
+        self.generation = generation
+        self.file.close()
+        self.file = open(journal_path(self.path), "wb")
+        self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, generation))
+        self.file.flush()
+
+    def _flush(self) -> None:
+        pending = self.pending
+        chunk = []
+        while pending:
+            item = pending.popleft()
+            if isinstance(item, bytes):
+                chunk.append(item)
+                continue
+            if chunk:
+                self.file.write(b"".join(chunk))
+                chunk = []
+            item()
+        if chunk:
+            self.file.write(b"".join(chunk))
+            self.file.flush()
+
+    def _writer(self) -> None:
+        while not self.closed:
+            self.wake.wait(AUTOSAVE_INTERVAL)
+            self.wake.clear()
+            self._flush()
+
+    def close(self) -> None:
+        """Write everything still pending and stop the writer thread."""
+        self.closed = True
+        self.wake.set()
+        self.thread.join()
+        self._flush()
+        self.file.close()
+
+
+def replay(records: Iterable[JournalRecord], blocks: List, add: Callable[[JournalRecord], object],
+           move: Callable[[object, JournalRecord], None], remove: Callable[[object], None]) -> None:
+    """
+    Apply journal records to blocks (snapshot order; new blocks are appended
+    so ids keep matching list positions). Removed blocks leave None behind.
+    """
+    for record in records:
+        if record.op == ADD:
+            while len(blocks) < record.block_id:
+                blocks.append(None)
+            block = add(record)
+            if record.block_id < len(blocks):
+                blocks[record.block_id] = block
+            else:
+                blocks.append(block)
+            continue
+        if record.block_id >= len(blocks) or blocks[record.block_id] is None:
+            continue
+        if record.op == MOVE:
+            move(blocks[record.block_id], record)
+        elif record.op == REMOVE:
+            remove(blocks[record.block_id])
+            blocks[record.block_id] = None